@@ -0,0 +1,100 @@
+"""Initial schema, as created by metadata.create_all before migrations were introduced.
+
+Databases created that way are brought under migrations with:
+    alembic stamp 0001_initial_schema
+
+Revision ID: 0001_initial_schema
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_initial_schema"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Lookup tables of the employee data: table -> (id column, name column, unique names).
+LOOKUP_TABLES = {
+    "level_data": ("level_id", "level", True),
+    "team_data": ("team_id", "team", True),
+    "department_data": ("department_id", "department", True),
+    "manager_data": ("manager_id", "manager", False),
+    "project_number_data": ("project_number_id", "project_number", True),
+    "project_code_data": ("project_code_id", "project_code", True),
+    "project_name_data": ("project_name_id", "project_name", True),
+}
+
+
+def upgrade():
+    for table, (id_column, name_column, unique) in LOOKUP_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column(id_column, sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column(name_column, sa.String(), nullable=False, unique=unique),
+        )
+
+    op.create_table(
+        "employee_data",
+        sa.Column("employee_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("indxx_id", sa.String(10), unique=True),
+        sa.Column("hr_code", sa.String(10), unique=True),
+        sa.Column("first_name", sa.String(50), nullable=False),
+        sa.Column("last_name", sa.String(100)),
+        sa.Column("start_date", sa.Date()),
+        *(
+            sa.Column(id_column, sa.Integer(), sa.ForeignKey(f"{table}.{id_column}"))
+            for table, (id_column, _, _) in LOOKUP_TABLES.items()
+        ),
+    )
+
+    op.create_table(
+        "role_data",
+        sa.Column("serial_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("employee_id", sa.Integer(), sa.ForeignKey("employee_data.employee_id"), unique=True, nullable=False),
+        sa.Column("is_super_user", sa.Boolean()),
+        sa.Column("is_admin", sa.Boolean()),
+    )
+
+    op.create_table(
+        "timesheet_data",
+        sa.Column("timesheet_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("employee_id", sa.Integer(), sa.ForeignKey("employee_data.employee_id")),
+        sa.Column("day_of_month", sa.Integer()),
+        sa.Column("month", sa.Integer()),
+        sa.Column("year", sa.Integer()),
+        sa.Column("work_description", sa.String(100)),
+        sa.Column("status", sa.String(20)),
+    )
+
+    op.create_table(
+        "leavesheet_data",
+        sa.Column("leavesheet_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("employee_id", sa.Integer(), sa.ForeignKey("employee_data.employee_id")),
+        sa.Column("leave_status", sa.String(100)),
+        sa.Column("leave_date", sa.Date()),
+        sa.Column("transaction_status", sa.String(20)),
+    )
+
+    op.create_table(
+        "holiday_data",
+        sa.Column("holiday_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("holiday_date", sa.Date(), nullable=False),
+        sa.Column("holiday", sa.String(100)),
+    )
+
+    op.create_table(
+        "time_window_data",
+        sa.Column("window_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("time_stamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("super_user_id", sa.Integer(), sa.ForeignKey("role_data.employee_id"), nullable=False),
+        sa.Column("status", sa.String(50)),
+    )
+
+
+def downgrade():
+    for table in ("time_window_data", "holiday_data", "leavesheet_data", "timesheet_data", "role_data", "employee_data"):
+        op.drop_table(table)
+    for table in reversed(list(LOOKUP_TABLES)):
+        op.drop_table(table)
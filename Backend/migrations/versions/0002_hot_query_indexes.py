@@ -0,0 +1,73 @@
+"""Indexes of the timesheet, leave and holiday lookups and unique timesheet days.
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY outside of a transaction,
+so the tables stay writable while they are built; the unique constraint then takes over its
+already built index. An index left invalid by an interrupted run is dropped and rebuilt.
+
+Revision ID: 0002_hot_query_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002_hot_query_indexes"
+down_revision = "0001_initial_schema"
+branch_labels = None
+depends_on = None
+
+UNIQUE_DAY = "uq_timesheet_data_employee_day"
+DAY_COLUMNS = ["employee_id", "year", "month", "day_of_month"]
+# name -> (table, columns)
+INDEXES = {
+    "ix_timesheet_data_year_month_day": ("timesheet_data", ["year", "month", "day_of_month"]),
+    "ix_leavesheet_data_employee_date_status": ("leavesheet_data", ["employee_id", "leave_date", "leave_status"]),
+    "ix_leavesheet_data_leave_date": ("leavesheet_data", ["leave_date"]),
+    "ix_holiday_data_holiday_date": ("holiday_data", ["holiday_date"]),
+}
+
+# Keeps the last saved entry of every day stored more than once, which the unique index would reject.
+DELETE_DUPLICATE_DAYS = f"""
+DELETE FROM timesheet_data WHERE timesheet_id IN (
+    SELECT timesheet_id FROM (
+        SELECT timesheet_id, row_number() OVER (
+            PARTITION BY {", ".join(DAY_COLUMNS)} ORDER BY timesheet_id DESC
+        ) AS position
+        FROM timesheet_data
+        WHERE {" AND ".join(f"{column} IS NOT NULL" for column in DAY_COLUMNS)}
+    ) AS ranked
+    WHERE position > 1
+)
+"""
+
+
+def upgrade():
+    op.execute(DELETE_DUPLICATE_DAYS)
+
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(UNIQUE_DAY, "timesheet_data", postgresql_concurrently=True, if_exists=True)
+            op.create_index(UNIQUE_DAY, "timesheet_data", DAY_COLUMNS, unique=True, postgresql_concurrently=True)
+            for name, (table, columns) in INDEXES.items():
+                op.drop_index(name, table, postgresql_concurrently=True, if_exists=True)
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+            op.execute(f"ALTER TABLE timesheet_data ADD CONSTRAINT {UNIQUE_DAY} UNIQUE USING INDEX {UNIQUE_DAY}")
+        return
+
+    with op.batch_alter_table("timesheet_data") as batch_op:
+        batch_op.create_unique_constraint(UNIQUE_DAY, DAY_COLUMNS)
+    for name, (table, columns) in INDEXES.items():
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_constraint(UNIQUE_DAY, "timesheet_data", type_="unique")
+        with op.get_context().autocommit_block():
+            for name, (table, _) in INDEXES.items():
+                op.drop_index(name, table, postgresql_concurrently=True, if_exists=True)
+        return
+
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table)
+    with op.batch_alter_table("timesheet_data") as batch_op:
+        batch_op.drop_constraint(UNIQUE_DAY, type_="unique")
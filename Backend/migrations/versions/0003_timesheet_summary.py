@@ -0,0 +1,49 @@
+"""Monthly timesheet summary of every employee, filled from the existing timesheet entries.
+
+Revision ID: 0003_timesheet_summary
+Revises: 0002_hot_query_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_timesheet_summary"
+down_revision = "0002_hot_query_indexes"
+branch_labels = None
+depends_on = None
+
+COUNTS = ("filled_days", "blank_days", "leave_days", "holiday_days")
+
+# Same counts as the summaries refreshed by the writers; weekends are counted in no column.
+BACKFILL = f"""
+INSERT INTO timesheet_summary_data (employee_id, year, month, {", ".join(COUNTS)}, last_updated)
+SELECT employee_id, year, month,
+    COUNT(CASE WHEN COALESCE(status, '') = '' AND COALESCE(work_description, '') <> '' THEN 1 END),
+    COUNT(CASE WHEN COALESCE(status, '') = '' AND COALESCE(work_description, '') = '' THEN 1 END),
+    COUNT(CASE WHEN status = 'Leave' THEN 1 END),
+    COUNT(CASE WHEN status = 'Holiday' THEN 1 END),
+    CURRENT_TIMESTAMP
+FROM timesheet_data
+WHERE employee_id IS NOT NULL AND year IS NOT NULL AND month IS NOT NULL
+GROUP BY employee_id, year, month
+"""
+
+
+def upgrade():
+    op.create_table(
+        "timesheet_summary_data",
+        sa.Column("summary_id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("employee_id", sa.Integer(), sa.ForeignKey("employee_data.employee_id"), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        *(sa.Column(column, sa.Integer(), nullable=False) for column in COUNTS),
+        sa.Column("last_updated", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.UniqueConstraint("employee_id", "year", "month", name="uq_timesheet_summary_data_employee_month"),
+    )
+    op.create_index("ix_timesheet_summary_data_year_month", "timesheet_summary_data", ["year", "month"])
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_index("ix_timesheet_summary_data_year_month", "timesheet_summary_data")
+    op.drop_table("timesheet_summary_data")
@@ -0,0 +1,66 @@
+"""Bulk loading of the cleaned upload dataframes into PostgreSQL with COPY.
+
+The dataframe is streamed into a temporary staging table with COPY FROM STDIN and merged into
+the target table by the server with a single INSERT ... SELECT, instead of sending every record
+as statement parameters. The staging table is dropped when the transaction commits. Other
+databases keep the ORM bulk writes."""
+
+import io
+import uuid
+
+import pandas as pd
+from sqlalchemy import Column, Integer, MetaData, Table, insert, select
+from sqlalchemy.orm import Session
+
+# Rows rendered into the COPY buffer at once, bounding the memory used by the buffer.
+COPY_CHUNK_ROWS = 100_000
+# Written for the missing values, so that empty strings are kept as such.
+NULL_MARKER = r"\N"
+
+
+def supports_copy(db: Session) -> bool:
+    """Whether the database of the session is loaded with COPY."""
+
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def copy_to_staging(db: Session, model, df: pd.DataFrame) -> Table:
+    """Creates a temporary table with the columns of the dataframe that belong to the table of
+    the model and copies the rows of the dataframe into it. Returns the staging table."""
+
+    target = model.__table__
+    columns = [column for column in df.columns if column in target.c]
+    staging = Table(
+        f"staging_{target.name}_{uuid.uuid4().hex[:8]}",
+        MetaData(),
+        *(Column(column, target.c[column].type) for column in columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+    staging.create(db.connection())
+
+    df = df[columns].copy()
+    for column in staging.c:
+        if isinstance(column.type, Integer):
+            df[column.name] = df[column.name].astype("Int64")
+
+    sql = f"COPY {staging.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')"
+    cursor = db.connection().connection.cursor()
+    try:
+        for start in range(0, len(df), COPY_CHUNK_ROWS):
+            buffer = io.StringIO()
+            df.iloc[start:start + COPY_CHUNK_ROWS].to_csv(buffer, index=False, header=False, na_rep=NULL_MARKER)
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+    return staging
+
+
+def copy_insert(db: Session, model, df: pd.DataFrame) -> int:
+    """Inserts the rows of the dataframe into the table of the model through a staging table.
+    Returns the number of inserted rows. Does not commit."""
+
+    staging = copy_to_staging(db, model, df)
+    statement = insert(model.__table__).from_select(staging.c.keys(), select(*staging.c))
+    return db.execute(statement).rowcount
@@ -1,137 +1,82 @@
 """Functions that fetches and reads the data stored in the database"""
 
+import calendar
+from collections import defaultdict
 from datetime import date
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 
-import pandas as pd
-from sqlalchemy import and_, desc, extract, select
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, desc, select
+from sqlalchemy.orm import Session, contains_eager, joinedload
 
 from src.db.model import models
 from src.db.schema import schemas
 
 
-def get_project_name_ids(db: Session, project_name_list: List[str]) -> List[int]:
-    """Retrieve a list of project_name_id for each project_name in the project_names list.
-    Args:project_names (list[str]): List of project names.
-    Returns: list[int]: List of corresponding project_name_id.
-    """
-    result = (
-        db.query(models.ProjectNameData.project_name_id)
-        .filter(models.ProjectNameData.project_name.in_(project_name_list))
-        .all()
-    )
-    project_name_ids = [row[0] for row in result]
-    return project_name_ids
+TIMESHEET_STATUSES = ("incomplete", "not_started", "complete")
 
 
-def get_inprogress_timesheet_employee_data(db: Session, names_id_list: List[int]):
-    """Gives us the Employees that have not filled the timesheet completely."""
-    
-    current_month = date.today().month
-    current_year = date.today().year
-
-    incomplete_timesheet_employee_data = (
-        db.query(
-            models.EmployeeData.indxx_id,
-            models.EmployeeData.first_name,
-            models.EmployeeData.last_name,
-        )
-        .outerjoin(
-            models.TimeSheetData,
-            and_(
-                models.TimeSheetData.month == current_month,
-                models.TimeSheetData.year == current_year,
-                models.EmployeeData.employee_id == models.TimeSheetData.employee_id
-                
-            ),
-        )
-        .filter(
-            and_(
-                models.EmployeeData.project_name_id.in_(names_id_list),
-                models.TimeSheetData.work_description == "",
-                models.TimeSheetData.status == "",
-            )
-        )
-        .distinct()
-    )
-
-    results = incomplete_timesheet_employee_data.all()
-    df = pd.DataFrame(results)
-    if df is not None and not df.empty:
-        df["name"] = df["first_name"] + " " + df["last_name"]
-        df.drop(columns=["first_name", "last_name"], inplace=True)
-    return df
+def get_timesheet_status_employee_data(db: Session, project_name_list: List[str]) -> Dict[str, Dict[str, list]]:
+    """Gives us the Employees of the projects grouped by the status of their timesheet of the current month.
+    Reads the timesheet summary of every employee with one query, so the timesheet entries are not scanned:
+    employees without summary have not started, employees with blank days are in progress and
+    the others have completed their timesheet.
+    Returns for every status the columns "indxx_id" and "name" of its employees."""
 
+    today = date.today()
+    employee = models.EmployeeData
+    summary = models.TimesheetSummaryData
 
-def get_not_started_timesheet_employee_data(db: Session, names_id_list: List[int]):
-    """Gives us the Employees that have not filled the timesheet completely."""
-    
-    current_month = date.today().month
-    current_year = date.today().year
-
-    not_started_timesheet_employee_data = (
-        db.query(
-            models.EmployeeData.indxx_id,
-            models.EmployeeData.first_name,
-            models.EmployeeData.last_name,
-        )
+    status = case(
+        (summary.summary_id.is_(None), "not_started"), (summary.blank_days > 0, "incomplete"), else_="complete"
+    )
+    rows = db.execute(
+        select(employee.indxx_id, employee.first_name, employee.last_name, status)
+        .join(models.ProjectNameData, employee.project_name_id == models.ProjectNameData.project_name_id)
         .outerjoin(
-            models.TimeSheetData,
+            summary,
             and_(
-                models.EmployeeData.employee_id == models.TimeSheetData.employee_id,
-                models.TimeSheetData.month == current_month,
-                models.TimeSheetData.year == current_year
+                summary.employee_id == employee.employee_id,
+                summary.year == today.year,
+                summary.month == today.month,
             ),
         )
-        .filter(
-            and_(
-            models.EmployeeData.project_name_id.in_(names_id_list),
-                models.TimeSheetData.work_description == None
-            )
-        )
+        .where(models.ProjectNameData.project_name.in_(project_name_list))
+        .order_by(employee.indxx_id)
     )
 
-    results = not_started_timesheet_employee_data.all()
-    df = pd.DataFrame(results)
-    if df is not None and not df.empty:
-        df["name"] = df["first_name"] + " " + df["last_name"]
-        df.drop(columns=["first_name", "last_name"], inplace=True)
-    return df
+    result = {name: {"indxx_id": [], "name": []} for name in TIMESHEET_STATUSES}
+    for indxx_id, first_name, last_name, employee_status in rows:
+        result[employee_status]["indxx_id"].append(indxx_id)
+        result[employee_status]["name"].append(" ".join(filter(None, (first_name, last_name))))
+    return result
 
 
-def get_completed_timesheet_employee_data(
-    db: Session,
-    df_incomplete_employee: pd.DataFrame,
-    df_not_started_employee: pd.DataFrame,
-    names_id_list: List[int],):
-    """Gives us the Employees that have filled the timesheet completely."""
+def fetch_timesheet_summary_data(year: int, month: int, db: Session) -> List[schemas.TimesheetSummary]:
+    """Fetch the timesheet summaries of every employee for a specific month and year, ordered by Indxx ID.
+    Employees without timesheet entries in the month have no summary."""
 
-    employee = (
-        db.query(
-            models.EmployeeData.indxx_id,
-            models.EmployeeData.first_name,
-            models.EmployeeData.last_name,
-        )
-        .filter(models.EmployeeData.project_name_id.in_(names_id_list))
-        .all()
+    employee = models.EmployeeData
+    summary = models.TimesheetSummaryData
+    rows = db.execute(
+        select(employee.indxx_id, employee.first_name, employee.last_name, summary)
+        .join(summary, summary.employee_id == employee.employee_id)
+        .where(summary.year == year, summary.month == month)
+        .order_by(employee.indxx_id)
     )
-
-    df_employee = pd.DataFrame(employee)
-    if df_employee is not None and not df_employee.empty:
-        df_employee["name"] = df_employee["first_name"] + " " + df_employee["last_name"]
-        df_employee.drop(columns=["first_name", "last_name"], inplace=True)
-
-    combined_subset = pd.concat([df_incomplete_employee, df_not_started_employee])
-    if not combined_subset.empty:
-        result_df = (
-            df_employee.merge(combined_subset, how="outer", indicator=True)
-            .query('_merge == "left_only"')
-            .drop("_merge", axis=1)
+    return [
+        schemas.TimesheetSummary(
+            indxx_id=indxx_id,
+            name=" ".join(filter(None, (first_name, last_name))),
+            year=row.year,
+            month=row.month,
+            filled_days=row.filled_days,
+            blank_days=row.blank_days,
+            leave_days=row.leave_days,
+            holiday_days=row.holiday_days,
+            last_updated=row.last_updated,
         )
-        return result_df
-    else:
-        return df_employee
+        for indxx_id, first_name, last_name, row in rows
+    ]
 
 
 def get_user_info(db: Session, indxx_id: str):
@@ -181,6 +126,179 @@ def get_timesheet_by_indxx_id_and_date(
     return combined_list
 
 
+def employee_to_dict(employee) -> Dict:
+    """Converts an employee along with its lookup data into a plain dictionary."""
+
+    return {
+        "employee_id": employee.employee_id,
+        "indxx_id": employee.indxx_id,
+        "hr_code": employee.hr_code,
+        "first_name": employee.first_name,
+        "last_name": employee.last_name,
+        "start_date": employee.start_date,
+        "level": employee.level.level if employee.level else None,
+        "team": employee.team.team if employee.team else None,
+        "department": employee.department.department if employee.department else None,
+        "manager": employee.manager.manager if employee.manager else None,
+        "project_number": employee.project_number.project_number if employee.project_number else None,
+        "project_code": employee.project_code.project_code if employee.project_code else None,
+        "project_name": employee.project_name.project_name if employee.project_name else None,
+    }
+
+
+def stoxx_employee_query(db: Session, month: int, year: int):
+    """Query of every employee along with its lookup data and its timesheet entries of the month,
+    one row per (employee, timesheet entry) pair."""
+
+    return (
+        db.query(models.EmployeeData, models.TimeSheetData)
+        .join(models.EmployeeData.project_code)
+        .outerjoin(
+            models.TimeSheetData,
+            and_(
+                models.TimeSheetData.employee_id == models.EmployeeData.employee_id,
+                models.TimeSheetData.month == month,
+                models.TimeSheetData.year == year,
+            ),
+        )
+        .options(
+            contains_eager(models.EmployeeData.project_code),
+            joinedload(models.EmployeeData.level),
+            joinedload(models.EmployeeData.team),
+            joinedload(models.EmployeeData.department),
+            joinedload(models.EmployeeData.manager),
+            joinedload(models.EmployeeData.project_number),
+            joinedload(models.EmployeeData.project_name),
+        )
+    )
+
+
+def get_stoxx_employee_data(
+    db: Session, project_code_list: List[str], month: int, year: int
+) -> Dict[str, List[Dict]]:
+    """Loads every employee of the given project codes together with their lookup data and
+    their timesheet entries of the month in a single query, then groups the rows in memory.
+    Returns:
+        Dict[str, List[Dict]]: project code -> list of employee dictionaries ordered by employee_id,
+        each with a "timesheet" list of entries sorted by day_of_month (empty if not filled).
+    """
+    rows = (
+        stoxx_employee_query(db, month, year)
+        .filter(models.ProjectCodeData.project_code.in_(project_code_list))
+        .order_by(models.EmployeeData.employee_id, models.TimeSheetData.day_of_month)
+        .all()
+    )
+
+    employees = {}
+    timesheets = defaultdict(dict)
+    for employee, entry in rows:
+        if employee.employee_id not in employees:
+            employees[employee.employee_id] = employee_to_dict(employee)
+        if entry is not None:
+            timesheets[employee.employee_id][entry.day_of_month] = {
+                "day_of_month": entry.day_of_month,
+                "work_description": entry.work_description,
+                "status": entry.status,
+            }
+
+    stoxx_data = {project_code: [] for project_code in project_code_list}
+    for employee_id, employee in employees.items():
+        employee["timesheet"] = sorted(
+            timesheets[employee_id].values(), key=lambda x: x["day_of_month"]
+        )
+        stoxx_data[employee["project_code"]].append(employee)
+    return stoxx_data
+
+
+def get_stoxx_leave_data(
+    db: Session, project_code_list: List[str], month: int, year: int
+) -> Dict[str, List[tuple]]:
+    """Loads the leave rows of the month of every employee of the given project codes in a single query.
+    Returns:
+        Dict[str, List[tuple]]: project code -> list of (employee_id, leave_date, leave_status,
+        transaction_status) tuples, ordered by employee_id and leave_date.
+    """
+    rows = (
+        db.query(
+            models.ProjectCodeData.project_code,
+            models.LeaveSheetData.employee_id,
+            models.LeaveSheetData.leave_date,
+            models.LeaveSheetData.leave_status,
+            models.LeaveSheetData.transaction_status,
+        )
+        .join(models.EmployeeData, models.EmployeeData.employee_id == models.LeaveSheetData.employee_id)
+        .join(models.EmployeeData.project_code)
+        .filter(
+            models.ProjectCodeData.project_code.in_(project_code_list),
+            models.LeaveSheetData.leave_date >= date(year, month, 1),
+            models.LeaveSheetData.leave_date <= date(year, month, calendar.monthrange(year, month)[1]),
+        )
+        .order_by(
+            models.LeaveSheetData.employee_id,
+            models.LeaveSheetData.leave_date,
+            models.LeaveSheetData.leave_status,
+            models.LeaveSheetData.transaction_status,
+        )
+        .all()
+    )
+    leave_data = defaultdict(list)
+    for project_code, *leave in rows:
+        leave_data[project_code].append(tuple(leave))
+    return leave_data
+
+
+def get_month_holidays(db: Session, month: int, year: int) -> List[tuple]:
+    """Loads the (holiday_date, holiday) rows of the month ordered by date."""
+
+    rows = (
+        db.query(models.HolidayData.holiday_date, models.HolidayData.holiday)
+        .filter(
+            models.HolidayData.holiday_date >= date(year, month, 1),
+            models.HolidayData.holiday_date <= date(year, month, calendar.monthrange(year, month)[1]),
+        )
+        .order_by(models.HolidayData.holiday_date, models.HolidayData.holiday)
+        .all()
+    )
+    return [tuple(row) for row in rows]
+
+
+def iter_stoxx_employee_data(
+    db: Session, month: int, year: int, project_code_list: Optional[List[str]] = None, batch_size: int = 1000
+) -> Iterator[Dict]:
+    """Streams the employees of the given project codes, or of every project code, ordered by
+    project code and employee_id, in the format of get_stoxx_employee_data.
+    The rows are fetched batch_size at a time and each employee is yielded as soon as all of its
+    timesheet entries are read, so only one employee is held in memory."""
+
+    query = stoxx_employee_query(db, month, year)
+    if project_code_list is not None:
+        query = query.filter(models.ProjectCodeData.project_code.in_(project_code_list))
+    rows = query.order_by(
+        models.ProjectCodeData.project_code, models.EmployeeData.employee_id, models.TimeSheetData.day_of_month
+    ).yield_per(batch_size)
+
+    current = None
+    for employee, entry in rows:
+        if current is None or current["employee_id"] != employee.employee_id:
+            if current is not None:
+                yield current
+            current = employee_to_dict(employee)
+            current["timesheet"] = []
+        if entry is not None:
+            timesheet = current["timesheet"]
+            day = {
+                "day_of_month": entry.day_of_month,
+                "work_description": entry.work_description,
+                "status": entry.status,
+            }
+            if timesheet and timesheet[-1]["day_of_month"] == entry.day_of_month:
+                timesheet[-1] = day
+            else:
+                timesheet.append(day)
+    if current is not None:
+        yield current
+
+
 def get_project_codes(db: Session) -> list[str]:
     """gets the list of all unique project codes from the project_code_data table."""
     
@@ -238,8 +356,8 @@ def fetch_compoff_data(year: int, month: int, db: Session):
        models.LeaveSheetData.transaction_status
    ).join(models.EmployeeData).where(
        models.LeaveSheetData.leave_status == "Comp Off",
-       extract('year', models.LeaveSheetData.leave_date) == year,
-       extract('month', models.LeaveSheetData.leave_date) == month
+       models.LeaveSheetData.leave_date >= date(year, month, 1),
+       models.LeaveSheetData.leave_date <= date(year, month, calendar.monthrange(year, month)[1])
    )
    result = db.execute(stmt).all()
    return [
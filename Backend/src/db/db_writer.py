@@ -1,33 +1,103 @@
 """Performs writing information in database"""
 
+from collections import defaultdict
 from datetime import date, datetime, timedelta
-from tempfile import NamedTemporaryFile
+from typing import Dict, Iterable, List, Optional
 
+import numpy as np
 import pandas as pd
 from fastapi import UploadFile
+from sqlalchemy import Integer, and_, bindparam, case, delete, func, literal_column, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 import src.db.schema.schemas as schemas
 import src.db.writer_func as wt  # assuming wt contains the checker functions
+from src.db import bulk_load, read_cache
 from src.db.model import models
-from src.db.model.database import engine
 
 
-def writing_to_db(df: pd.DataFrame, table, db: Session):
-    """Takes the dataframe and the table name as input, Bulk inserts the records in dataframe into database."""
+def insert_records(df: pd.DataFrame, table, db: Session):
+    """Bulk inserts the records in dataframe into the table, without committing.
+    On PostgreSQL the records are loaded with COPY through a staging table."""
 
-    records = df.to_dict(orient="records")
-    db.bulk_insert_mappings(table, records)  # type: ignore
-    db.commit()
-    db.close()
+    if bulk_load.supports_copy(db):
+        bulk_load.copy_insert(db, table, df)
+    else:
+        records = df.to_dict(orient="records")
+        db.bulk_insert_mappings(table, records)  # type: ignore
+
+
+def timesheet_summary_select(months: list, employee_ids: Optional[list] = None):
+    """SELECT of the timesheet_summary_data rows of the (year, month) pairs computed from their
+    timesheet entries, for the given employees only if any. Weekends are counted in no column."""
+
+    table = models.TimeSheetData
+    working_day = func.coalesce(table.status, "") == ""
+    described = func.coalesce(table.work_description, "") != ""
+    criteria = [tuple_(table.year, table.month).in_(months)]
+    criteria.append(table.employee_id.is_not(None) if employee_ids is None else table.employee_id.in_(employee_ids))
+    return (
+        select(
+            table.employee_id,
+            table.year,
+            table.month,
+            func.count(case((and_(working_day, described), 1))).label("filled_days"),
+            func.count(case((and_(working_day, ~described), 1))).label("blank_days"),
+            func.count(case((table.status == "Leave", 1))).label("leave_days"),
+            func.count(case((table.status == "Holiday", 1))).label("holiday_days"),
+            func.now().label("last_updated"),
+        )
+        .where(*criteria)
+        .group_by(table.employee_id, table.year, table.month)
+    )
+
+
+def refresh_timesheet_summary(db: Session, months, employee_ids: Optional[Iterable[int]] = None) -> int:
+    """Recomputes the timesheet_summary_data rows of the (year, month) pairs from the timesheet entries,
+    of the given employees only if any, else of every employee.
+    Called by the writers changing the timesheet so that only the summaries they touched are rewritten,
+    with one DELETE and one INSERT ... SELECT per chunk of employees.
+    Returns the number of summary rows written. Does not commit."""
+
+    months = sorted(set(months))
+    if not months:
+        return 0
+    summary = models.TimesheetSummaryData
+    columns = ["employee_id", "year", "month", "filled_days", "blank_days", "leave_days", "holiday_days", "last_updated"]
+    groups = [None] if employee_ids is None else wt.chunks(sorted(set(employee_ids)))
+
+    written = 0
+    for ids in groups:
+        if ids is not None and not ids:
+            continue
+        criteria = [tuple_(summary.year, summary.month).in_(months)]
+        if ids is not None:
+            criteria.append(summary.employee_id.in_(ids))
+        # Employee months left without timesheet entries have no summary.
+        db.execute(delete(summary).where(*criteria).execution_options(synchronize_session=False))
+
+        rows = timesheet_summary_select(months, ids)
+        insert = wt.dialect_insert(db, summary)
+        if insert is None:
+            statement = summary.__table__.insert().from_select(columns, rows)
+        else:
+            # Summaries written by a concurrent writer in the meantime.
+            statement = insert.from_select(columns, rows).on_conflict_do_update(
+                index_elements=["employee_id", "year", "month"],
+                set_={column: insert.excluded[column] for column in columns[3:]},
+            )
+        written += db.execute(statement).rowcount
+    return written
 
 
-def update_employee_data_to_db(df: pd.DataFrame, table, db: Session):   
+def update_employee_data_to_db(df: pd.DataFrame, table, db: Session) -> Dict[str, str]:   
     """updates/insert employee details in employee data table.
     Takes the dataframe as an input then seperates its entries based on unique entries(should be inserted 
     directly) and those entries which should be updated(previously present in the database).
-    Bulk insert the entries that should be inserted and bulk update those entries which should be updated."""
+    Bulk insert the entries that should be inserted and bulk update those entries which should be updated.
+    Returns whether each indxx_id was "inserted" or "updated". Does not commit."""
     
     df = df.dropna(subset=["indxx_id"])
     records = df.to_dict(orient="records")
@@ -46,160 +116,244 @@ def update_employee_data_to_db(df: pd.DataFrame, table, db: Session):
     if records_to_update:
         db.bulk_update_mappings(table, records_to_update)
 
-    db.commit()
-    db.close()
+    return {
+        **{record["indxx_id"]: "inserted" for record in records_to_insert},
+        **{record["indxx_id"]: "updated" for record in records_to_update},
+    }
 
 
-def save_employee_data_to_db(file: UploadFile, db: Session):
-    """Takes the file as an input and converts it into a dataframe, then add all the columns of the ids(level_id, 
-    team_id, etc) to the database and pass this function to the 'update_employee_data_to_db' function."""
+def upsert_employee_data_to_db(df: pd.DataFrame, db: Session) -> Dict[str, str]:
+    """Inserts the new employees and updates the existing ones, matched on indxx_id, with a single
+    INSERT ... ON CONFLICT (indxx_id) DO UPDATE, fed from a COPY staging table on PostgreSQL and
+    sent in batches of rows elsewhere. Rows whose values are all unchanged are left untouched,
+    so uploading the same file again writes nothing.
+    Falls back to 'update_employee_data_to_db' on databases without ON CONFLICT.
+    Returns whether each indxx_id was "inserted", "updated" or "unchanged". Does not commit."""
 
-    with NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(file.file.read())
-        tmp.flush()
-        df = pd.read_csv(tmp.name)
+    df = df.dropna(subset=["indxx_id"]).drop_duplicates(subset=["indxx_id"], keep="last")
+    table = models.EmployeeData.__table__
+    columns = [column.key for column in table.columns if column.key in df.columns and column.key != "employee_id"]
+    df = df[columns].astype(object).where(df[columns].notna(), None)
+    records = df.to_dict(orient="records")
+    if not records:
+        return {}
+
+    insert = wt.dialect_insert(db, models.EmployeeData)
+    if insert is None:
+        return update_employee_data_to_db(df, models.EmployeeData, db)
+    if bulk_load.supports_copy(db):
+        staging = bulk_load.copy_to_staging(db, models.EmployeeData, df)
+        insert = insert.from_select(columns, select(*staging.c))
+        records = None
+
+    changed_columns = [column for column in columns if column != "indxx_id"]
+    statement = insert.on_conflict_do_update(
+        index_elements=["indxx_id"],
+        set_={column: insert.excluded[column] for column in changed_columns},
+        where=or_(*(table.c[column].is_distinct_from(insert.excluded[column]) for column in changed_columns)),
+    )
+    outcomes = dict.fromkeys(df["indxx_id"], "unchanged")
+    if db.get_bind().dialect.name == "postgresql":
+        # xmax is 0 for the row versions created by the insert and set for the updated ones.
+        rows = db.execute(statement.returning(table.c.indxx_id, literal_column("xmax = 0")), records).all()
+        outcomes.update((indxx_id, "inserted" if is_new else "updated") for indxx_id, is_new in rows)
+    else:
+        # New rows are numbered after every existing one.
+        last_id = db.query(func.max(models.EmployeeData.employee_id)).scalar() or 0
+        rows = db.execute(statement.returning(table.c.indxx_id, table.c.employee_id), records).all()
+        outcomes.update(
+            (indxx_id, "inserted" if employee_id > last_id else "updated") for indxx_id, employee_id in rows
+        )
+    return outcomes
 
-        df["level_id"] = df.apply(lambda row: wt.level_check(row, db), axis=1)
-        df["team_id"] = df.apply(lambda row: wt.team_check(row, db), axis=1)
-        df["manager_id"] = df.apply(lambda row: wt.manager_check(row, db), axis=1)
-        df["department_id"] = df.apply(lambda row: wt.department_check(row, db), axis=1)
-        df["project_code_id"] = df.apply(
-            lambda row: wt.project_code_check(row, db), axis=1)
-        df["project_number_id"] = df.apply(
-            lambda row: wt.project_number_check(row, db), axis=1)
-        df["project_name_id"] = df.apply(
-            lambda row: wt.project_name_check(row, db), axis=1)
 
-        update_employee_data_to_db(df, models.EmployeeData, db)
+# Outcome kept for an employee written by several chunks: being inserted or updated by one of them wins.
+EMPLOYEE_OUTCOME_RANKS = {"unchanged": 0, "updated": 1, "inserted": 2}
 
 
-def save_timesheetdata_to_db_streamlit(timesheet_data, db: Session):
+def save_employee_data_to_db(file: UploadFile, db: Session):
+    """Reads the file in chunks of rows, then for each chunk add all the columns of the ids(level_id, 
+    team_id, etc) to the database and pass it to the 'upsert_employee_data_to_db' function.
+    All the chunks are written in a single transaction, so a failing chunk leaves nothing written,
+    and the cached project codes, project names and users are invalidated once committed.
+    Returns the count of inserted, updated and unchanged employees, each indxx_id counted once."""
+
+    outcomes = {}
+    try:
+        for df in wt.iter_upload_chunks(file, "employee data"):
+            df = wt.resolve_employee_dimensions(df, db)
+            for indxx_id, outcome in upsert_employee_data_to_db(df, db).items():
+                previous = outcomes.get(indxx_id, "unchanged")
+                outcomes[indxx_id] = max(previous, outcome, key=EMPLOYEE_OUTCOME_RANKS.get)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    read_cache.invalidate(read_cache.PROJECT_CODES, read_cache.PROJECT_NAMES, read_cache.USERS)
+
+    counts = dict.fromkeys(EMPLOYEE_OUTCOME_RANKS, 0)
+    for outcome in outcomes.values():
+        counts[outcome] += 1
+    return {key: counts[key] for key in ("inserted", "updated", "unchanged")}
+
+
+def save_timesheetdata_to_db_streamlit(timesheet_data, db: Session) -> int:
     """takes the JSON of timesheet_data.
     updates the work_description of the entries that are present in the database 
-    and adds the entries not present in the database."""
-
-    for entry in timesheet_data:
+    and adds the entries not present in the database.
+    The employee is looked up once and the entries of the month are loaded with one query, then only
+    the new and changed days are written with a single upsert on (employee_id, year, month, day_of_month).
+    The timesheet summaries of the employees with changed days are refreshed.
+    Returns the number of changed days."""
 
-        entry_dict = entry.dict()
-        empid = db.query(models.EmployeeData.employee_id).filter_by(indxx_id=entry_dict["indxx_id"]).first()
-        if empid:
-            employee_id = empid.employee_id
-        else:
-            raise ValueError("User with given Index ID does not exist.")
+    if not timesheet_data:
+        return 0
 
-        day_of_month = entry_dict["day_of_month"]
-        month = datetime.now().month
-        year = datetime.now().year
+    month = datetime.now().month
+    year = datetime.now().year
+    table = models.TimeSheetData
 
-        existing_entry = (
-            db.query(models.TimeSheetData)
-            .filter_by(
-                employee_id=employee_id,
-                day_of_month=day_of_month,
-                month=month,
-                year=year,
+    indxx_ids = {entry.indxx_id for entry in timesheet_data}
+    employee_ids = dict(
+        db.query(models.EmployeeData.indxx_id, models.EmployeeData.employee_id)
+        .filter(models.EmployeeData.indxx_id.in_(indxx_ids))
+        .all()
+    )
+    if len(employee_ids) < len(indxx_ids):
+        raise ValueError("User with given Index ID does not exist.")
+
+    existing_entries = {
+        (employee_id, day_of_month): (timesheet_id, work_description, status)
+        for timesheet_id, employee_id, day_of_month, work_description, status in db.query(
+            table.timesheet_id, table.employee_id, table.day_of_month, table.work_description, table.status
+        ).filter(table.employee_id.in_(employee_ids.values()), table.month == month, table.year == year)
+    }
+
+    # The last entry of a day wins.
+    records = {}
+    for entry in timesheet_data:
+        employee_id = employee_ids[entry.indxx_id]
+        records[(employee_id, entry.day_of_month)] = {
+            "employee_id": employee_id,
+            "day_of_month": entry.day_of_month,
+            "month": month,
+            "year": year,
+            "work_description": entry.work_description,
+            "status": entry.status,
+        }
+    changed = {
+        key: record for key, record in records.items()
+        if existing_entries.get(key, (None,))[1:] != (record["work_description"], record["status"])
+    }
+
+    if changed:
+        insert = wt.dialect_insert(db, table)
+        if insert is not None:
+            db.execute(
+                insert.values(list(changed.values())).on_conflict_do_update(
+                    index_elements=["employee_id", "year", "month", "day_of_month"],
+                    set_={"work_description": insert.excluded.work_description, "status": insert.excluded.status},
+                )
             )
-            .first()
-        )
-
-        if existing_entry:
-            existing_entry.work_description = entry_dict["work_description"]
-            existing_entry.status = entry_dict["status"]
-
         else:
-            new_entry = models.TimeSheetData(
-                employee_id=employee_id,
-                day_of_month=day_of_month,
-                month=month,
-                year=year,
-                work_description=entry_dict["work_description"],
-                status=entry_dict["status"],
+            db.bulk_insert_mappings(
+                table, [record for key, record in changed.items() if key not in existing_entries]
             )
-            db.add(new_entry)
+            db.bulk_update_mappings(
+                table,
+                [
+                    {**record, "timesheet_id": existing_entries[key][0]}
+                    for key, record in changed.items() if key in existing_entries
+                ],
+            )
+        refresh_timesheet_summary(db, [(year, month)], {employee_id for employee_id, _ in changed})
     db.commit()
     db.close()
+    return len(changed)
 
 
-def delete_entry_from_leavesheet_db(df: pd.DataFrame, table, db: Session):
-    """Takes a dataframe as an input.
-    Deletes the records in dataframe from database"""
-
-    data = df.to_dict(orient="records")
-
-    for record in data:
-        db.query(table).filter(
-            table.employee_id == record["employee_id"],
-            table.leave_status == record["leave_status"],
-            table.leave_date == record["leave_date"],
-            table.transaction_status == record["transaction_status"],
-        ).delete(synchronize_session=False)
-    db.commit()
-    db.close()
+def delete_entry_from_leavesheet_db(df: pd.DataFrame, table, db: Session) -> int:
+    """Takes a dataframe of records read from the table as an input.
+    Deletes them, identified by their leavesheet_id, with one DELETE per chunk of records.
+    Returns the number of deleted records. Does not commit."""
 
+    deleted = 0
+    for ids in wt.chunks(df["leavesheet_id"].astype("int64").tolist()):
+        deleted += (
+            db.query(table)
+            .filter(table.leavesheet_id.in_(ids))
+            .delete(synchronize_session=False)
+        )
+    return deleted
 
-def update_timesheet_adding_new_leavesheet_entries(df: pd.DataFrame, db: Session):
-    """Takes a dataframe as an input.
-    For each entry, it checks if there is any timesheet entry.
-    If there is an timesheet entry, it changes its ("status" = "") to "leave" and "work_description" to "". 
-    """
 
-    for index, row in df.iterrows():
-        employee_id = row["employee_id"]
-        leave_date = row["leave_date"]
-        day_of_month = leave_date.day
-        month = leave_date.month
-        year = leave_date.year
+def leave_days_criteria(db: Session, keys: list) -> list:
+    """WHERE criteria matching the timesheet entries of the (employee_id, year, month, day_of_month) keys.
+    On PostgreSQL the entries are joined to the keys unnested from one integer array per column,
+    which the planner can hash and which keeps the statement the same whatever the number of keys.
+    Elsewhere a tuple IN is used."""
 
-        timesheet_entry = (
-            db.query(models.TimeSheetData)
-            .filter_by(
-                employee_id=employee_id,
-                day_of_month=day_of_month,
-                month=month,
-                year=year,
-            )
-            .first()
+    table = models.TimeSheetData
+    key_columns = ("employee_id", "year", "month", "day_of_month")
+    if db.get_bind().dialect.name == "postgresql":
+        arrays = (
+            bindparam(name, list(values), type_=postgresql.ARRAY(Integer))
+            for name, values in zip(key_columns, zip(*keys))
+        )
+        leave_days = func.unnest(*arrays).table_valued(*key_columns).render_derived(name="leave_days")
+        return [getattr(table, name) == leave_days.c[name] for name in key_columns]
+    return [tuple_(*(getattr(table, name) for name in key_columns)).in_(keys)]
+
+
+def update_timesheet_status_of_leave_days(df: pd.DataFrame, db: Session, status: str, values: dict) -> int:
+    """Takes a dataframe of leaves as an input.
+    Applies the values to the timesheet entries of the leave days having the given status,
+    with one UPDATE per chunk of days. Returns the number of updated timesheet entries."""
+
+    table = models.TimeSheetData
+    updated = 0
+    for keys in wt.chunks(wt.leave_day_keys(df)):
+        statement = (
+            update(table)
+            .where(table.status == status, *leave_days_criteria(db, keys))
+            .values(values)
+            .execution_options(synchronize_session=False)
         )
+        updated += db.execute(statement).rowcount
+    return updated
 
-        if timesheet_entry:
-            if timesheet_entry.status == "":
-                timesheet_entry.status = "Leave"
-                timesheet_entry.work_description = ""
 
-    db.commit()
-    db.close()
+def update_timesheet_adding_new_leavesheet_entries(df: pd.DataFrame, db: Session) -> int:
+    """Takes a dataframe as an input.
+    Changes the ("status" = "") of the timesheet entries of its leave days to "leave" and their "work_description" to "".
+    Returns the number of updated timesheet entries. Does not commit.
+    """
+
+    return update_timesheet_status_of_leave_days(
+        df, db, "", {models.TimeSheetData.status: "Leave", models.TimeSheetData.work_description: ""}
+    )
 
 
-def update_timesheet_removing_old_leavesheet_entries(df: pd.DataFrame, db: Session):
+def update_timesheet_removing_old_leavesheet_entries(df: pd.DataFrame, db: Session) -> int:
     """Takes a dataframe as an input.
-    For each entry, it checks if there is any timesheet entry.
-    If there is an timesheet entry, it changes its "status" to ("") in place of "Leave". 
+    Changes the "status" of the timesheet entries of its leave days to ("") in place of "Leave".
+    Returns the number of updated timesheet entries. Does not commit.
     """
-    
-    for index, row in df.iterrows():
-        employee_id = row["employee_id"]
-        leave_date = row["leave_date"]
-        day_of_month = leave_date.day
-        month = leave_date.month
-        year = leave_date.year
-
-        timesheet_entry = (
-            db.query(models.TimeSheetData)
-            .filter_by(
-                employee_id=employee_id,
-                day_of_month=day_of_month,
-                month=month,
-                year=year,
-            )
-            .first()
-        )
 
-        if timesheet_entry:
-            if timesheet_entry.status == "Leave":
-                timesheet_entry.status = ""
+    return update_timesheet_status_of_leave_days(df, db, "Leave", {models.TimeSheetData.status: ""})
 
-    db.commit()
-    db.close()
+
+def refresh_timesheet_summary_of_leaves(df: pd.DataFrame, db: Session) -> int:
+    """Takes a dataframe of leaves as an input.
+    Recomputes the timesheet summaries of the months of its leave days for its employees.
+    Returns the number of summary rows written. Does not commit."""
+
+    keys = wt.leave_day_keys(df)
+    return refresh_timesheet_summary(
+        db, [(year, month) for _, year, month, _ in keys], [employee_id for employee_id, *_ in keys]
+    )
 
 
 def writing_leave_data_to_db(df: pd.DataFrame, db: Session):
@@ -208,7 +362,8 @@ def writing_leave_data_to_db(df: pd.DataFrame, db: Session):
     Then, it compares the previous data with the new data and filters the entries exclusive to each DataFrame.
     Then, it writes the new entries(df_distinct) to the database and deletes the entries(previous_df_distinct),
     so that only the latest data of leaves is present into the database.
-    It also updates the timesheet accordingly.
+    It also updates the timesheet and the timesheet summaries of the changed leaves accordingly.
+    Everything is written in a single transaction, so the leaves are never seen half updated.
     """
     
     year = datetime.now().year
@@ -222,7 +377,7 @@ def writing_leave_data_to_db(df: pd.DataFrame, db: Session):
     )
 
     sql_query = leaves.statement
-    previous_df = pd.read_sql(sql_query, engine)
+    previous_df = pd.read_sql(sql_query, db.connection())
 
     if previous_df.empty:
         previous_df = pd.DataFrame(
@@ -235,7 +390,6 @@ def writing_leave_data_to_db(df: pd.DataFrame, db: Session):
             }
         )
 
-    previous_df.drop(columns=["leavesheet_id"], inplace=True)
     previous_df["leave_date"] = pd.to_datetime(previous_df["leave_date"])
     df["leave_date"] = pd.to_datetime(df["leave_date"])
 
@@ -248,176 +402,161 @@ def writing_leave_data_to_db(df: pd.DataFrame, db: Session):
     )
 
     previous_df_distinct = merged_df[merged_df["_merge"] == "left_only"].drop(columns=["_merge"])
-    df_distinct = merged_df[merged_df["_merge"] == "right_only"].drop(columns=["_merge"])
+    df_distinct = merged_df[merged_df["_merge"] == "right_only"].drop(columns=["_merge", "leavesheet_id"])
 
-    if previous_df_distinct is not None and not previous_df_distinct.empty:
+    if not previous_df_distinct.empty:
         update_timesheet_removing_old_leavesheet_entries(previous_df_distinct, db)
         delete_entry_from_leavesheet_db(previous_df_distinct, models.LeaveSheetData, db)
 
-    if df_distinct is not None and not df_distinct.empty:
+    if not df_distinct.empty:
         update_timesheet_adding_new_leavesheet_entries(df_distinct, db)
-        writing_to_db(df_distinct, models.LeaveSheetData, db)
+        insert_records(df_distinct, models.LeaveSheetData, db)
 
+    changed = pd.concat([previous_df_distinct, df_distinct])
+    if not changed.empty:
+        refresh_timesheet_summary_of_leaves(changed, db)
 
-def save_leavesheet_data_to_db(file: UploadFile, db: Session):
-    """Takes the file as an input and converts it into a dataframe. 
-    Then, it converts the dataframe according to need,
+    db.commit()
+    db.close()
+
+
+def current_month_leaves(df: pd.DataFrame) -> pd.DataFrame:
+    """Takes a chunk of rows of the leave file.
     Does not take entries with ("Work from Home") and ("Number of Days" = "0.5").
     Converts the "from_date" and "to_date" column into a single one with "leave_date" and only considers date from current month.
-    Adds an "employee_id" column and drops "indxx_id" column.
-    Then passes it to 'writing_leave_data_to_db'."""
-
-    with NamedTemporaryFile(delete=False) as tmp:
-
-        tmp.write(file.file.read())
-        tmp.flush()
-        df = pd.read_csv(tmp.name)
-        new_header_index = 2
-        new_header = df.iloc[new_header_index]
-
-        df = df[3:]
-        df.columns = new_header
-
-        df.reset_index(drop=True, inplace=True)
-
-        df = df[df["Leave/Holiday"] != "Work from Home"]
-        df = df[df["Number of Days"] != "0.5"]
-
-        df = df.drop(
-            [
-                "Name of the Employee",
-                "Number of Days",
-                "Remarks",
-                "Applied On",
-                "Contact Details",
-            ],
-            axis=1,
-        )
+    Every leave is clipped to the current month and repeated once per day, the day offsets
+    being computed for all leaves at once."""
+
+    df = df[df["Leave/Holiday"] != "Work from Home"]
+    df = df[df["Number of Days"] != "0.5"]
+
+    today = datetime.now()
+    month_start = pd.Timestamp(today.year, today.month, 1)
+    month_end = month_start + pd.offsets.MonthEnd(0)
+
+    from_dates = pd.to_datetime(df["From Date"], format="%d-%b-%y").clip(lower=month_start)
+    to_dates = pd.to_datetime(df["To Date"], format="%d-%b-%y").clip(upper=month_end)
+    days = (to_dates - from_dates).dt.days.fillna(-1).clip(lower=-1).to_numpy(dtype=np.int64) + 1
+
+    # Position of every repeated row within the days of its leave.
+    offsets = np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days)
+    return pd.DataFrame(
+        {
+            "indxx_id": np.repeat(df["Employee No"].to_numpy(), days),
+            "leave_status": np.repeat(df["Leave/Holiday"].to_numpy(), days),
+            "leave_date": np.repeat(from_dates.to_numpy(), days) + offsets.astype("timedelta64[D]"),
+            "transaction_status": np.repeat(df["Transaction Status"].to_numpy(), days),
+        }
+    )
 
-        df["From Date"] = pd.to_datetime(df["From Date"], format="%d-%b-%y")
-        df["To Date"] = pd.to_datetime(df["To Date"], format="%d-%b-%y")
-
-        result = []
-        current_year = datetime.now().year
-        current_month = datetime.now().month
-
-        for idx, row in df.iterrows():
-            date_range = pd.date_range(start=row["From Date"], end=row["To Date"])
-
-            for date in date_range:
-                if date.year == current_year and date.month == current_month:
-                    result.append(
-                        {
-                            "indxx_id": row["Employee No"],
-                            "leave_status": row["Leave/Holiday"],
-                            "leave_date": date,
-                            "transaction_status": row["Transaction Status"],
-                        }
-                    )
-
-        result_df = pd.DataFrame(result)
-
-        if result_df is not None and not result_df.empty:
-            result_df.columns = [
-                "indxx_id",
-                "leave_status",
-                "leave_date",
-                "transaction_status",
-            ]
-
-            result_df["employee_id"] = result_df.apply(
-                lambda row: wt.indxx_id_check(row, db), axis=1
-            )
-            result_df = result_df.drop("indxx_id", axis=1)
-            result_df = result_df.iloc[:, [3, 0, 1, 2]]
-            writing_leave_data_to_db(result_df, db)
+
+def save_leavesheet_data_to_db(file: UploadFile, db: Session):
+    """Reads the file in chunks of rows, the header being on its fourth line,
+    and converts every chunk according to need with 'current_month_leaves'.
+    Adds an "employee_id" column, looking all the indxx_ids up with one query, and drops "indxx_id" column.
+    Raises ValueError if an indxx_id is not in the database.
+    Then passes the leaves of the whole file to 'writing_leave_data_to_db'.
+    Returns the number of rows read."""
+
+    chunks = []
+    rows = 0
+    for df in wt.iter_upload_chunks(file, "leavesheet", skiprows=3, dtype=str):
+        rows += len(df)
+        chunks.append(current_month_leaves(df))
+
+    result_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    if not result_df.empty:
+        indxx_ids = result_df["indxx_id"].dropna().unique().tolist()
+        employees = pd.DataFrame(
+            db.query(models.EmployeeData.indxx_id, models.EmployeeData.employee_id)
+            .filter(models.EmployeeData.indxx_id.in_(indxx_ids))
+            .all(),
+            columns=["indxx_id", "employee_id"],
+        )
+        result_df = result_df.merge(employees, on="indxx_id", how="left")
+        missing = result_df.loc[result_df["employee_id"].isna(), "indxx_id"].unique()
+        if len(missing):
+            raise ValueError(f"Indxx IDs do not exist in the database: {', '.join(map(str, missing))}")
+        result_df = result_df[["employee_id", "leave_status", "leave_date", "transaction_status"]]
+        writing_leave_data_to_db(result_df, db)
+    return rows
 
 
-def writing_comp_off_data_to_database(df: pd.DataFrame, db: Session):
+def writing_comp_off_data_to_database(df: pd.DataFrame, db: Session) -> int:
     """This function takes the dataframe of comp off data as an input.
-    Checks if the entry is present in the database.
-    If present then updates its "transaction_status", if not present inserts it into the leavesheet_data table
-    Changes the timesheet_data table accordingly.
-    Adds "Leave" into the "status" of the timesheet where there is comp_off.
+    Loads the stored comp offs of its days with one query and compares them in memory:
+    the missing entries are bulk inserted (with COPY on PostgreSQL) into the leavesheet_data table and the entries whose
+    "transaction_status" changed are bulk updated.
+    Changes the timesheet_data table accordingly, with one update per chunk of days:
+    adds "Leave" into the "status" of the timesheet where a comp off is added or becomes availed and
+    clears it where it is not availed anymore, and refreshes the timesheet summaries of the changed days.
+    Everything is written in a single transaction. Returns the number of changed comp off days.
     """
- 
-    records = df.to_dict(orient="records")
+
+    if df.empty:
+        db.close()
+        return 0
+
+    df = df.drop_duplicates(subset=["employee_id", "leave_date"], keep="last")
+    table = models.LeaveSheetData
+    stored = db.query(table.leavesheet_id, table.employee_id, table.leave_date, table.transaction_status).filter(
+        table.leave_status == "Comp Off",
+        table.employee_id.in_(df["employee_id"].unique().tolist()),
+        table.leave_date >= df["leave_date"].min().date(),
+        table.leave_date <= df["leave_date"].max().date(),
+    ).order_by(table.leavesheet_id.desc())
+    # The first entry wins where a day is stored more than once.
+    existing = {(employee_id, leave_date): (leavesheet_id, status) for leavesheet_id, employee_id, leave_date, status in stored}
+
     records_to_insert = []
     records_to_update = []
-    for record in records:
-        existing_record = (
-            db.query(models.LeaveSheetData)
-            .filter_by(
-                employee_id=record["employee_id"],
-                leave_status=record["leave_status"],
-                leave_date=record["leave_date"],
-            )
-            .first()
-        )
- 
-        if existing_record:
-            if record["transaction_status"] != existing_record.transaction_status:
-                record["leavesheet_id"] = existing_record.leavesheet_id
-                records_to_update.append(record)
-                if record["transaction_status"] == 'AVAILED':
-                    timesheet_entry = (
-                        db.query(models.TimeSheetData)
-                        .filter_by(
-                            employee_id=record["employee_id"],
-                            day_of_month=record["leave_date"].date().day,
-                            month=record["leave_date"].date().month,
-                            year=record["leave_date"].date().year,
-                        )
-                        .first()
-                    )
- 
-                    if timesheet_entry:
-                        if timesheet_entry.status == "":
-                            timesheet_entry.status = "Leave"
-                            timesheet_entry.work_description = ""
-               
-                else:
-                    timesheet_entry = (
-                        db.query(models.TimeSheetData)
-                        .filter_by(
-                            employee_id=record["employee_id"],
-                            day_of_month=record["leave_date"].date().day,
-                            month=record["leave_date"].date().month,
-                            year=record["leave_date"].date().year,
-                        )
-                        .first()
-                    )
- 
-                    if timesheet_entry:
-                        if timesheet_entry.status == "Leave":
-                            timesheet_entry.status = ""
-                           
-        else:
+    for record in df.to_dict(orient="records"):
+        match = existing.get((record["employee_id"], record["leave_date"].date()))
+        if match is None:
             records_to_insert.append(record)
- 
-            timesheet_entry = (
-                db.query(models.TimeSheetData)
-                .filter_by(
-                    employee_id=record["employee_id"],
-                    day_of_month=record["leave_date"].date().day,
-                    month=record["leave_date"].date().month,
-                    year=record["leave_date"].date().year,
-                )
-                .first()
-            )
-            if timesheet_entry:
-                if timesheet_entry.status == "":
-                    timesheet_entry.status = "Leave"
-                    timesheet_entry.work_description = ""
+        elif record["transaction_status"] != match[1]:
+            records_to_update.append({**record, "leavesheet_id": match[0]})
 
     if records_to_insert:
-        db.bulk_insert_mappings(models.LeaveSheetData, records_to_insert)
- 
+        insert_records(pd.DataFrame(records_to_insert), table, db)
     if records_to_update:
-        db.bulk_update_mappings(models.LeaveSheetData, records_to_update)
- 
+        db.bulk_update_mappings(table, records_to_update)
+
+    changed = pd.DataFrame(records_to_insert + records_to_update, columns=df.columns)
+    # Every newly added comp off marks its day as Leave, whatever its "transaction_status".
+    marked = pd.DataFrame(
+        records_to_insert + [record for record in records_to_update if record["transaction_status"] == "AVAILED"],
+        columns=df.columns,
+    )
+    if not marked.empty:
+        update_timesheet_adding_new_leavesheet_entries(marked, db)
+    updated = pd.DataFrame(records_to_update, columns=df.columns)
+    not_availed = updated[updated["transaction_status"] != "AVAILED"]
+    if not not_availed.empty:
+        update_timesheet_removing_old_leavesheet_entries(not_availed, db)
+    if not changed.empty:
+        refresh_timesheet_summary_of_leaves(changed, db)
+
     db.commit()
     db.close()
+    return len(changed)
+
+
+def comp_off_rows(employee_id: int, from_date: date, to_date: date, transaction_status: str) -> list:
+    """Comp off entries of the days from from_date to to_date that fall in the current month."""
+
+    today = datetime.now()
+    return [
+        {
+            "employee_id": employee_id,
+            "leave_status": "Comp Off",
+            "leave_date": day,
+            "transaction_status": transaction_status,
+        }
+        for day in pd.date_range(start=from_date, end=to_date)
+        if day.year == today.year and day.month == today.month
+    ]
 
 
 def create_comp_off_df(db: Session, indxx_id: str, from_date: date, to_date: date, transaction_status: str):
@@ -425,84 +564,111 @@ def create_comp_off_df(db: Session, indxx_id: str, from_date: date, to_date: dat
     Takes the entries of the current month only.
     Converts the entry into a dataframe and passes it to 'writing_comp_off_data_to_database'."""
 
-    employee = db.query(models.EmployeeData).filter_by(indxx_id=indxx_id).first()
-    if employee is not None:
-        employee_id = employee.employee_id
-    else:
-        raise ValueError("Indxx ID does not exist in the database")
-
-    result = []
-    current_year = datetime.now().year
-    current_month = datetime.now().month
-
-    date_range = pd.date_range(start=from_date, end=to_date)
-
-    for date in date_range:
-        if date.year == current_year and date.month == current_month:
-            result.append(
-                {
-                    "employee_id": employee_id,
-                    "leave_status": "Comp Off",
-                    "leave_date": date,
-                    "transaction_status": transaction_status,
-                }
-            )
+    return create_comp_off_batch_df(
+        db,
+        [schemas.CompOffData(indxx_id=indxx_id, from_date=from_date, to_date=to_date, transaction_status=transaction_status)],
+    )
+
+
+def create_comp_off_batch_df(db: Session, comp_offs: List[schemas.CompOffData]) -> int:
+    """Comp Off data of many employees and date ranges is added to database in one go.
+    Resolves all the Indxx IDs with one query, takes the entries of the current month only and passes
+    them to 'writing_comp_off_data_to_database'. A later entry of the same day wins.
+    Returns the number of changed comp off days."""
+
+    indxx_ids = {comp_off.indxx_id for comp_off in comp_offs}
+    employee_ids = dict(
+        db.query(models.EmployeeData.indxx_id, models.EmployeeData.employee_id)
+        .filter(models.EmployeeData.indxx_id.in_(indxx_ids))
+        .all()
+    )
+    missing = sorted(indxx_ids - employee_ids.keys())
+    if missing:
+        raise ValueError(f"Indxx IDs do not exist in the database: {', '.join(missing)}")
+
+    result = [
+        row
+        for comp_off in comp_offs
+        for row in comp_off_rows(
+            employee_ids[comp_off.indxx_id], comp_off.from_date, comp_off.to_date, comp_off.transaction_status
+        )
+    ]
+    result_df = pd.DataFrame(result, columns=["employee_id", "leave_status", "leave_date", "transaction_status"])
+    return writing_comp_off_data_to_database(result_df, db)
+
+
+def holiday_days_criteria(dates) -> list:
+    """WHERE criteria matching the timesheet entries of the given dates."""
 
-    result_df = pd.DataFrame(result)
-    writing_comp_off_data_to_database(result_df, db)
+    table = models.TimeSheetData
+    return [tuple_(table.year, table.month, table.day_of_month).in_([(d.year, d.month, d.day) for d in dates])]
 
 
 def write_holiday_to_db(df: pd.DataFrame, model, db: Session):
     """This function helps to insert or update the data of holidays in the database
-    Also it updates the timesheet accordingly."""
+    Also it updates the timesheet accordingly.
+    The stored holidays are loaded with one query and compared in memory with the uploaded ones:
+    a date missing for a holiday moves one of its stored dates that is not uploaded, else is inserted.
+    The timesheet is then updated with one statement for the new dates and one for the dates left
+    without any holiday, and the timesheet summaries of their months are refreshed."""
  
     df['holiday_date'] = df['holiday_date'].apply(lambda x:x.date())
- 
+    today = date.today()
+    df = df[[(d.month >= today.month) and (d.year >= today.year) for d in df["holiday_date"]]]
+
+    uploaded = defaultdict(set)
+    for holiday, holiday_date in zip(df["holiday"], df["holiday_date"]):
+        uploaded[holiday].add(holiday_date)
+
+    stored = defaultdict(list)
+    for holiday_id, holiday, holiday_date in db.query(model.holiday_id, model.holiday, model.holiday_date).order_by(
+        model.holiday_id
+    ):
+        stored[holiday].append((holiday_id, holiday_date))
+
+    records_to_insert = []
     records_to_update = []
-    records_to_delete = []
-    for _, row in df.iterrows():
-        if (row["holiday_date"].month >= date.today().month) and (row["holiday_date"].year >= date.today().year):
-            existing_record = (
-                db.query(model).filter(model.holiday == row["holiday"]).first()
-            )
-            if existing_record:
-                if existing_record.holiday_date != row["holiday_date"]:
-                    records_to_delete.append(existing_record.holiday_date)
-                    records_to_update.append(row["holiday_date"])
-                    existing_record.holiday_date = row["holiday_date"]
- 
+    moved_from = set()
+    for holiday, dates in uploaded.items():
+        stored_dates = {holiday_date for _, holiday_date in stored[holiday]}
+        movable = [(holiday_id, d) for holiday_id, d in stored[holiday] if d not in dates]
+        for holiday_date in sorted(dates - stored_dates):
+            if movable:
+                holiday_id, old_date = movable.pop(0)
+                records_to_update.append({"holiday_id": holiday_id, "holiday_date": holiday_date})
+                moved_from.add(old_date)
             else:
-                records_to_update.append(row["holiday_date"])
-                new_record = model(holiday_date=row["holiday_date"], holiday=row["holiday"])
-                db.add(new_record)
-    db.commit()
- 
- 
-    for entry in records_to_update:
+                records_to_insert.append({"holiday": holiday, "holiday_date": holiday_date})
+
+    if records_to_insert:
+        db.bulk_insert_mappings(model, records_to_insert)
+    if records_to_update:
+        db.bulk_update_mappings(model, records_to_update)
+
+    new_dates = {record["holiday_date"] for record in records_to_insert + records_to_update}
+    moved_ids = {record["holiday_id"] for record in records_to_update}
+    holiday_dates = new_dates | {
+        holiday_date for dates in stored.values() for holiday_id, holiday_date in dates if holiday_id not in moved_ids
+    }
+    cleared_dates = moved_from - holiday_dates
+
+    if cleared_dates:
+        db.query(models.TimeSheetData).filter(
+            models.TimeSheetData.status == "Holiday", *holiday_days_criteria(cleared_dates)
+        ).update({models.TimeSheetData.status: ''}, synchronize_session=False)
+    if new_dates:
         db.query(models.TimeSheetData).filter(
-            models.TimeSheetData.day_of_month == entry.day,
-            models.TimeSheetData.month == entry.month,# .date()
-            models.TimeSheetData.year == entry.year,
             models.TimeSheetData.status != "Saturday",
             models.TimeSheetData.status != "Sunday",
+            *holiday_days_criteria(new_dates),
         ).update(
             {
                 models.TimeSheetData.work_description: '',
                 models.TimeSheetData.status: 'Holiday'
-            }
+            },
+            synchronize_session=False,
         )
- 
-    for entry in records_to_delete:
-        db.query(models.TimeSheetData).filter(
-                models.TimeSheetData.day_of_month == entry.day,
-                models.TimeSheetData.month == entry.month,
-                models.TimeSheetData.year == entry.year,
-                models.TimeSheetData.status == "Holiday",
-            ).update(
-                {
-                    models.TimeSheetData.status: ''
-                }
-            )
+    refresh_timesheet_summary(db, {(d.year, d.month) for d in cleared_dates | new_dates})
        
     db.commit()
     db.close()
@@ -510,28 +676,32 @@ def write_holiday_to_db(df: pd.DataFrame, model, db: Session):
 
 def save_holiday_data_to_db(uploaded_file: UploadFile, db: Session):
     """Takes the file of the holiday data.
-    Converts the file into a dataframe and transforms it according to our need.
-    Pass the dataframe to 'write_holiday_to_db' function."""
-
-    with NamedTemporaryFile(delete=False) as tmp:
-
-        tmp.write(uploaded_file.file.read())
-        tmp.flush()
-        df = pd.read_csv(tmp.name)
+    Reads the file in chunks of rows and transforms each chunk according to our need.
+    Pass all the chunks at once to 'write_holiday_to_db' function, so the whole calendar is compared
+    with the stored one and written in a single transaction.
+    Returns the number of rows read."""
 
+    chunks = []
+    for df in wt.iter_upload_chunks(uploaded_file, "holiday"):
         df["holiday_date"] = pd.to_datetime(df["holiday_date"], format="%d-%m-%Y")
 
         df.columns = [
             "holiday_date",
             "holiday",
         ]
+        chunks.append(df)
 
-        write_holiday_to_db(df, models.HolidayData, db)
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(
+        {"holiday_date": pd.Series(dtype="datetime64[ns]"), "holiday": pd.Series(dtype="str")}
+    )
+    write_holiday_to_db(df, models.HolidayData, db)
+    return len(df)
 
 
 def create_user_role(db: Session, user: schemas.RoleCreate):
     """Creates and updates user role.
-    Deletes the entry corresponding to the "user" role from the role_data table."""
+    Deletes the entry corresponding to the "user" role from the role_data table.
+    The cached users are invalidated when the role changes."""
     
     empid = db.query(models.EmployeeData.employee_id).filter_by(indxx_id=user.indxx_id).first()
     if empid:
@@ -544,6 +714,7 @@ def create_user_role(db: Session, user: schemas.RoleCreate):
         if (user.is_super_user == False) and (user.is_admin == False):
             db.delete(check)
             db.commit()
+            read_cache.invalidate(read_cache.USERS)
             db.close()
             return {"message": f"{user.indxx_id} is now a Normal User"}
    
@@ -554,6 +725,7 @@ def create_user_role(db: Session, user: schemas.RoleCreate):
             check.is_admin = user.is_admin
             check.is_super_user = user.is_super_user
             db.commit()
+            read_cache.invalidate(read_cache.USERS)
             db.close()
             if(user.is_super_user):
                 return {"message": f"{user.indxx_id} is now a Super User"}
@@ -572,6 +744,7 @@ def create_user_role(db: Session, user: schemas.RoleCreate):
             )
             db.add(new_entry)
             db.commit()
+            read_cache.invalidate(read_cache.USERS)
             db.close()
             if(user.is_super_user):
                 return {"message": f"{user.indxx_id} is now a Super User"}
@@ -580,7 +753,8 @@ def create_user_role(db: Session, user: schemas.RoleCreate):
             
 
 def insert_update_in_timewindow(window_data: schemas.TimeWindow, db: Session) -> None:
-    """Function to insert/update timesheet window status into the database"""
+    """Function to insert/update timesheet window status into the database.
+    The cached window status is invalidated."""
 
     super_user_id = (
         db.query(models.EmployeeData)
@@ -601,6 +775,7 @@ def insert_update_in_timewindow(window_data: schemas.TimeWindow, db: Session) ->
         )
     db.add(new_entry)
     db.commit()
+    read_cache.invalidate(read_cache.TIME_WINDOW)
     db.close()
 
 
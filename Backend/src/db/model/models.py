@@ -2,7 +2,7 @@
 
 import datetime
 
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -116,6 +116,12 @@ class TimeSheetData(Base):
     """Defining timesheet models"""
 
     __tablename__ = "timesheet_data"
+    __table_args__ = (
+        # One entry per employee and day; also serves the lookups of an employee's month.
+        UniqueConstraint("employee_id", "year", "month", "day_of_month", name="uq_timesheet_data_employee_day"),
+        # Days updated for every employee at once, e.g. holidays.
+        Index("ix_timesheet_data_year_month_day", "year", "month", "day_of_month"),
+    )
     timesheet_id = Column(Integer, primary_key=True, autoincrement=True)
     employee_id = Column(Integer, ForeignKey("employee_data.employee_id"))
     day_of_month = Column(Integer)
@@ -127,10 +133,38 @@ class TimeSheetData(Base):
     employees = relationship("EmployeeData", back_populates="time_sheet")
 
 
+class TimesheetSummaryData(Base):
+    """Defining the monthly summary of the timesheet of every employee.
+    Derived from timesheet_data and kept up to date by the writers changing it."""
+
+    __tablename__ = "timesheet_summary_data"
+    __table_args__ = (
+        UniqueConstraint("employee_id", "year", "month", name="uq_timesheet_summary_data_employee_month"),
+        # Summaries of a month across employees.
+        Index("ix_timesheet_summary_data_year_month", "year", "month"),
+    )
+    summary_id = Column(Integer, primary_key=True, autoincrement=True)
+    employee_id = Column(Integer, ForeignKey("employee_data.employee_id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    filled_days = Column(Integer, nullable=False, default=0)
+    blank_days = Column(Integer, nullable=False, default=0)
+    leave_days = Column(Integer, nullable=False, default=0)
+    holiday_days = Column(Integer, nullable=False, default=0)
+    last_updated: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
 class LeaveSheetData(Base):
     """Defining leavesheet models"""
 
     __tablename__ = "leavesheet_data"
+    __table_args__ = (
+        Index("ix_leavesheet_data_employee_date_status", "employee_id", "leave_date", "leave_status"),
+        # Leaves of a month across employees.
+        Index("ix_leavesheet_data_leave_date", "leave_date"),
+    )
     leavesheet_id = Column(Integer, primary_key=True, autoincrement=True)
     employee_id = Column(Integer, ForeignKey("employee_data.employee_id"))
     leave_status = Column(String(100))
@@ -144,6 +178,7 @@ class HolidayData(Base):
     """Defining holiday_data table models"""
 
     __tablename__ = "holiday_data"
+    __table_args__ = (Index("ix_holiday_data_holiday_date", "holiday_date"),)
     holiday_id = Column(Integer, primary_key=True, autoincrement=True)
     holiday_date = Column(Date, nullable=False)
     holiday = Column(String(100))
@@ -0,0 +1,74 @@
+"""In-process cache of the small reference data read on every page of the UI.
+
+Entries are grouped in namespaces (project codes, project names, users, time window) and expire
+after READ_CACHE_TTL seconds. The writers changing the underlying tables invalidate their
+namespaces once committed, so the TTL only bounds staleness left by changes made outside the
+application. Every entry carries the ETag of its JSON value for conditional requests."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+PROJECT_CODES = "project_codes"
+PROJECT_NAMES = "project_names"
+USERS = "users"
+TIME_WINDOW = "time_window"
+
+TTL_SECONDS = float(os.getenv("READ_CACHE_TTL", "300"))
+
+_lock = threading.Lock()
+# (namespace, key) -> (expiry, value, etag)
+_entries: Dict[Tuple[str, Hashable], Tuple[float, Any, str]] = {}
+# Bumped by every invalidation, so that a value loaded before it is not stored after it.
+_generations: Dict[str, int] = {}
+
+
+def etag(value) -> str:
+    """Strong ETag of the JSON representation of the value."""
+
+    body = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
+
+def get_or_load(namespace: str, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, str]:
+    """Returns the JSON compatible value cached for the key of the namespace along with its ETag,
+    calling the loader and caching its result when the entry is missing or expired.
+    A value loaded while the namespace is invalidated is returned but not cached."""
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get((namespace, key))
+        if entry is not None and entry[0] > now:
+            return entry[1], entry[2]
+        generation = _generations.get(namespace, 0)
+
+    value = jsonable_encoder(loader())
+    value_etag = etag(value)
+    with _lock:
+        if _generations.get(namespace, 0) == generation:
+            _entries[(namespace, key)] = (now + TTL_SECONDS, value, value_etag)
+    return value, value_etag
+
+
+def invalidate(*namespaces: str):
+    """Drops the entries of the namespaces."""
+
+    with _lock:
+        for namespace in namespaces:
+            _generations[namespace] = _generations.get(namespace, 0) + 1
+        for entry_key in [entry_key for entry_key in _entries if entry_key[0] in namespaces]:
+            del _entries[entry_key]
+
+
+def clear():
+    """Drops every entry."""
+
+    with _lock:
+        for namespace in {namespace for namespace, _ in _entries} | set(_generations):
+            _generations[namespace] = _generations.get(namespace, 0) + 1
+        _entries.clear()
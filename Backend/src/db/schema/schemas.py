@@ -1,7 +1,7 @@
 """Schemas of Response Model"""
 
-from datetime import date
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -186,6 +186,20 @@ class StoxxSheet(BaseModel):
     year: int
 
 
+class StoxxJob(BaseModel):
+    """Schema for the state of a stoxx sheet generation job"""
+
+    job_id: str
+    status: str
+    month: int
+    year: int
+    projects: Dict[str, str]
+    status_list: Optional[List[Dict[str, str]]]
+    error: Optional[str]
+    created_at: float
+    finished_at: Optional[float]
+
+
 class CompOffData(BaseModel):
     """Schema for comp off data"""
 
@@ -195,6 +209,26 @@ class CompOffData(BaseModel):
     transaction_status: str
 
 
+class CompOffBatch(BaseModel):
+    """Schema for comp off data of many employees and date ranges"""
+
+    comp_offs: List[CompOffData]
+
+
+class TimesheetSummary(BaseModel):
+    """Schema for the monthly timesheet summary of an employee"""
+
+    indxx_id: str
+    name: str
+    year: int
+    month: int
+    filled_days: int
+    blank_days: int
+    leave_days: int
+    holiday_days: int
+    last_updated: datetime
+
+
 class SelectedOptions(BaseModel):
     """Schema for selected options of project names"""
 
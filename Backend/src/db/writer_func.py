@@ -1,92 +1,144 @@
 """Checker functions used to implement validations for the file upload api"""
+import logging
+import os
+from typing import Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from src.db.model import models
 
+# Lookup tables of the employee data: column of the csv -> (model, name field, id field).
+EMPLOYEE_DIMENSIONS = {
+    "level": (models.LevelData, "level", "level_id"),
+    "team": (models.TeamData, "team", "team_id"),
+    "manager": (models.ManagerData, "manager", "manager_id"),
+    "department": (models.DepartmentData, "department", "department_id"),
+    "project_code": (models.ProjectCodeData, "project_code", "project_code_id"),
+    "project_number": (models.ProjectNumberData, "project_number", "project_number_id"),
+    "project_name": (models.ProjectNameData, "project_name", "project_name_id"),
+}
+DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+# Key tuples matched by a single tuple IN, keeping every statement within the parameter limits of the databases.
+TUPLE_IN_CHUNK_ROWS = 5000
+# Rows of an uploaded csv parsed at once.
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "50000"))
 
-def get_or_create_id(
-    db: Session, model, name_field: str, name_value: str, id_field: str
-):
-    """Generic function to get or create an ID for a given model"""
-    instance = db.query(model).filter(getattr(model, name_field) == name_value).first()
-
-    if instance:
-        return getattr(instance, id_field)
-    else:
-        new_instance = model(**{name_field: name_value})
-        db.add(new_instance)
-        db.commit()
-        db.refresh(new_instance)
-        return getattr(new_instance, id_field)
-
-
-def level_check(row, db: Session):
-    """Checks and Assigns level id's to levels
-    Else creates a new entry in the database and returns the id corresponding to it"""
-
-    return get_or_create_id(
-        db, models.LevelData, "level", row["level"], "level_id")
+logger = logging.getLogger(__name__)
 
 
-def team_check(row, db: Session):
-    """Checks and Assigns team id's to levels
-    Else creates a new entry in the database and returns the id corresponding to it"""
+def iter_upload_chunks(
+    file: UploadFile, name: str, chunksize: Optional[int] = None, **read_csv_kwargs
+) -> Iterator[pd.DataFrame]:
+    """Parses the uploaded csv straight from its spooled stream, yielding dataframes of at most
+    chunksize rows (UPLOAD_CHUNK_ROWS by default), so large files are never fully held in memory.
+    The rows processed so far are logged after every chunk. read_csv_kwargs are passed to 'pd.read_csv'."""
 
-    return get_or_create_id(
-        db, models.TeamData, "team", row["team"], "team_id"
-    )
+    file.file.seek(0)
+    rows = 0
+    with pd.read_csv(file.file, chunksize=chunksize or UPLOAD_CHUNK_ROWS, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            rows += len(chunk)
+            yield chunk
+            logger.info("Processed %d rows of the %s upload %s", rows, name, file.filename)
 
 
-def manager_check(row, db: Session):
-    """Checks and Assigns manager id's to managers
-    Else creates a new entry in the database and returns the id corresponding to it"""
+def chunks(items: list, size: int = TUPLE_IN_CHUNK_ROWS) -> Iterator[list]:
+    """Splits the items into lists of at most size items."""
 
-    return get_or_create_id(
-        db, models.ManagerData, "manager", row["manager"], "manager_id"
-    )
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 
-def department_check(row, db: Session):
-    """Checks and Assigns department id's to departments
-    Else creates a new entry in the database and returns the id corresponding to it"""
+def leave_day_keys(df: pd.DataFrame) -> list:
+    """Distinct (employee_id, year, month, day_of_month) keys of the timesheet entries of the
+    leave days of the dataframe, as plain python ints."""
 
-    return get_or_create_id(
-        db, models.DepartmentData, "department", row["department"], "department_id"
-    )
+    leave_dates = pd.to_datetime(df["leave_date"])
+    keys = pd.DataFrame(
+        {
+            "employee_id": df["employee_id"].astype("int64"),
+            "year": leave_dates.dt.year,
+            "month": leave_dates.dt.month,
+            "day_of_month": leave_dates.dt.day,
+        }
+    ).drop_duplicates()
+    return list(zip(*(keys[column].tolist() for column in keys.columns)))
 
 
-def project_number_check(row, db: Session):
-    """Checks and Assigns project number id's to project numbers
-    Else creates a new entry in the database and returns the id corresponding to it"""
+def dialect_insert(db: Session, model):
+    """INSERT statement of the database dialect, supporting ON CONFLICT and RETURNING.
+    None if the dialect has no such statement."""
 
-    return get_or_create_id(
-        db,
-        models.ProjectNumberData,
-        "project_number",
-        row["project_number"],
-        "project_number_id",
-    )
+    insert = DIALECT_INSERTS.get(db.get_bind().dialect.name)
+    return insert(model) if insert else None
 
 
-def project_code_check(row, db: Session):
-    """Checks and Assigns project code id's to project codes
-    Else creates a new entry in the database and returns the id corresponding to it"""
-    
-    return get_or_create_id(
-        db, models.ProjectCodeData, "project_code", row["project_code"], "project_code_id"
-    )
-
-
-def project_name_check(row, db: Session):
-    """Checks and Assigns project name id's to project names
-    Else creates a new entry in the database and returns the id corresponding to it"""
-
-    return get_or_create_id(
-        db, models.ProjectNameData, "project_name", row["project_name"], "project_name_id"
-    )
+def get_or_create_id(
+    db: Session, model, name_field: str, name_value: str, id_field: str
+):
+    """Generic function to get or create an ID for a given model. The new instance is not committed."""
+    instance = db.query(model).filter(getattr(model, name_field) == name_value).first()
 
+    if instance:
+        return getattr(instance, id_field)
+    else:
+        new_instance = model(**{name_field: name_value})
+        db.add(new_instance)
+        db.flush()
+        return getattr(new_instance, id_field)
 
-def indxx_id_check(row, db:Session):
-    """Checks and Assigns employee_id to indxx_id
-    Else creates a new entry in the database and returns the id corresponding to it""" 
 
-    return get_or_create_id(db, models.EmployeeData, "indxx_id",row["indxx_id"],"employee_id")
\ No newline at end of file
+def get_or_create_ids(
+    db: Session, model, name_field: str, name_values: Iterable[str], id_field: str
+) -> Dict[str, int]:
+    """Bulk version of get_or_create_id: maps every distinct value to its id, loading the existing
+    values in one query and inserting the missing ones in one INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    The new values are not committed."""
+
+    name_values = set(name_values)
+    if not name_values:
+        return {}
+    name_column = getattr(model, name_field)
+    id_column = getattr(model, id_field)
+
+    def existing_ids(values) -> Dict[str, int]:
+        # Ordered so that the first id wins where a name is stored more than once.
+        rows = db.execute(
+            select(name_column, id_column).where(name_column.in_(values)).order_by(id_column.desc())
+        )
+        return dict(rows.all())
+
+    ids = existing_ids(name_values)
+    missing = sorted(name_values - ids.keys())
+    if missing:
+        insert = dialect_insert(db, model)
+        if insert is None:
+            for value in missing:
+                ids[value] = get_or_create_id(db, model, name_field, value, id_field)
+            return ids
+        rows = db.execute(
+            insert.values([{name_field: value} for value in missing])
+            .on_conflict_do_nothing()
+            .returning(name_column, id_column)
+        )
+        ids.update(rows.all())
+        # Values inserted by a concurrent upload in the meantime.
+        if len(ids) < len(name_values):
+            ids.update(existing_ids(name_values - ids.keys()))
+    return ids
+
+
+def resolve_employee_dimensions(df: pd.DataFrame, db: Session) -> pd.DataFrame:
+    """Adds the level_id, team_id, ... columns of the lookup tables to the employee data, creating
+    the missing lookup values. Takes a couple of queries per lookup table whatever the number of rows;
+    empty values get no id."""
+
+    for column, (model, name_field, id_field) in EMPLOYEE_DIMENSIONS.items():
+        names = df[column].map(str, na_action="ignore")
+        ids = get_or_create_ids(db, model, name_field, names.dropna().unique(), id_field)
+        mapped = names.map(ids).astype("Int64")
+        df[id_field] = mapped.astype(object).where(mapped.notna(), None)
+    return df
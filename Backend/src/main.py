@@ -1,30 +1,65 @@
 """API to upload a file"""
 import json
 import logging
+import os
+from contextlib import asynccontextmanager
 from datetime import date, datetime
-from typing import List
+from typing import Callable, Hashable, List
 
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
 
 from src.db import db_reader as read
 from src.db import db_writer as write
+from src.db import read_cache
 from src.db.model import models
-from src.db.model.database import engine, get_db
+from src.db.model.database import get_db
 from src.db.schema import schemas
-from src.service import BytesIO, create_timesheet_template, generate_stoxx_timesheet
+from src.service import (
+    create_timesheet_template,
+    generate_stoxx_timesheet,
+    stream_stoxx_timesheet,
+    write_stoxx_roster_file,
+)
+from src.stoxx import jobs, pool, templates
 
 logging.basicConfig(
     level=logging.INFO, filemode="a", format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-models.Base.metadata.create_all(bind=engine)
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Loads the stoxx templates and records the stoxx jobs left unfinished by a previous run as failed
+    at startup, and stops the stoxx job and worker pools when the application shuts down."""
+
+    templates.warm()
+    jobs.fail_orphaned_jobs()
+    yield
+    jobs.shutdown()
+    pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 MESSAGE = {"message": "File uploaded successfully and data stored in database."}
 
 
+def cached_response(request: Request, namespace: str, key: Hashable, loader: Callable) -> Response:
+    """JSON response of the value cached for the key of the namespace, loaded by the loader when
+    missing, with its ETag. Answers 304 with no body when the request's If-None-Match holds the ETag."""
+
+    value, etag = read_cache.get_or_load(namespace, key, loader)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=value, headers=headers)
+
+
 @app.get("/", tags=["Swagger UI"])
 async def docs_redirect():
     """Redirect to docs - Swagger UI."""
@@ -35,11 +70,12 @@ async def docs_redirect():
 
 @app.post("/add_employee_data", tags=["Employee Data"])
 async def add_employee_data(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Takes the csv file of employee data as input and updates it into employee_data table of the database."""
+    """Takes the csv file of employee data as input and updates it into employee_data table of the database.
+    Returns the count of inserted, updated and unchanged employees along with the message."""
     
     try:
-        write.save_employee_data_to_db(file, db)
-        return MESSAGE
+        counts = write.save_employee_data_to_db(file, db)
+        return {**MESSAGE, **counts}
     except Exception as e:
         logger.error("Failed to upload employee data file: %s", e)
         raise HTTPException(status_code=406, detail="Failed to upload file.") from e
@@ -47,24 +83,32 @@ async def add_employee_data(file: UploadFile = File(...), db: Session = Depends(
 
 @app.post("/upload_leavesheet", tags=["Leavesheet"])
 async def upload_leavesheet(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Takes the csv file of leaves data as input and updates it into leavesheet_data table of the database."""
+    """Takes the csv file of leaves data as input and updates it into leavesheet_data table of the database.
+    Returns the number of rows read along with the message."""
 
     try:
-        write.save_leavesheet_data_to_db(file, db)
-        return MESSAGE
+        rows = write.save_leavesheet_data_to_db(file, db)
+        return {**MESSAGE, "rows": rows}
     except Exception as e:
         logger.error("Failed to upload leavesheet file: %s", e)
         raise HTTPException(status_code=406, detail="Failed to upload leave sheet file.") from e
 
 
 @app.get("/users/{indxx_id}", response_model=schemas.EmployeeData, tags=["Employee Data"])
-async def get_user(indxx_id: str, db: Session = Depends(get_db)):
+async def get_user(indxx_id: str, request: Request, db: Session = Depends(get_db)):
     """Gets the information of the Employee using their Indxx ID
-    Returns the json of the Employee data in the schemas.EmployeeData format."""
+    Returns the json of the Employee data in the schemas.EmployeeData format, cached and with an ETag."""
 
-    try:
+    def load_user():
         db_user = read.get_user_info(db, indxx_id=indxx_id)
-        return db_user
+        if db_user is None:
+            raise LookupError(f"User {indxx_id} does not exist")
+        return schemas.EmployeeData.model_validate(db_user, from_attributes=True)
+
+    try:
+        return cached_response(request, read_cache.USERS, indxx_id, load_user)
+    except LookupError as e:
+        raise HTTPException(detail=str(e), status_code=404) from e
     except Exception as e:
         logger.error("Failed to fetch user data for Indxx id %s:%s", indxx_id, e)
         raise HTTPException(detail=str(e), status_code=500) from e
@@ -103,11 +147,12 @@ async def time_sheet_data(indxx_id: str, month: int, year: int, db: Session = De
 
 @app.post("/add_timesheet", tags=["Timesheet"]) 
 async def add_timesheet(timesheet_data: List[schemas.TimeSheetData], db: Session = Depends(get_db)):
-    """Takes the JSON(List[schemas.TimeSheetData]) as an input and updates the data into database."""
+    """Takes the JSON(List[schemas.TimeSheetData]) as an input and updates the data into database.
+    Returns the number of changed days along with the message."""
 
     try:
-        write.save_timesheetdata_to_db_streamlit(timesheet_data, db)
-        return MESSAGE
+        changed_days = write.save_timesheetdata_to_db_streamlit(timesheet_data, db)
+        return {**MESSAGE, "changed_days": changed_days}
     except Exception as e:
         logger.error("Failed to upload timesheet data: %s", e)
         raise HTTPException(
@@ -128,20 +173,26 @@ async def update_comp_off_data(data: schemas.CompOffData, db: Session = Depends(
         raise HTTPException(status_code=400, detail=f"{str(e)}")
 
 
+@app.post("/update_comp_off_data_batch", tags=["Leavesheet"])
+async def update_comp_off_data_batch(data: schemas.CompOffBatch, db: Session = Depends(get_db)):
+    """Updates data of Comp Off of many employees and date ranges in leavesheet_data table, in one transaction"""
+
+    try:
+        changed_days = write.create_comp_off_batch_df(db, data.comp_offs)
+        return {"detail": "Comp Off data added successfully", "changed_days": changed_days}
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"{str(e)}")
+
+
 @app.post("/timesheet_status", tags=["Timesheet"])
 async def timesheet_status(names_list: schemas.SelectedOptions, db: Session = Depends(get_db)):  #: List[str]
     """Gives the status(completed, inprogress and not yet started) of timesheet of Employees.
     Takes the list of the project names, data of employees corresponding to the list is then returned."""
     
     try:
-        names_id_list = read.get_project_name_ids(db, names_list.project_names_list)
-        df_not_started_employee = read.get_not_started_timesheet_employee_data(db, names_id_list)
-        df_incomplete_employee = read.get_inprogress_timesheet_employee_data(db, names_id_list)
-        df_complete_employee = read.get_completed_timesheet_employee_data(db,df_incomplete_employee
-                                                                            ,df_not_started_employee, names_id_list)
-
-        return {"incomplete_data": df_incomplete_employee,"not_started_data":df_not_started_employee
-                , "complete_data": df_complete_employee}
+        statuses = read.get_timesheet_status_employee_data(db, names_list.project_names_list)
+        return {f"{status}_data": employees for status, employees in statuses.items()}
 
     except:
         raise HTTPException(status_code=500,detail="No employees found who has not submitted the timesheets for this month.",)
@@ -149,11 +200,12 @@ async def timesheet_status(names_list: schemas.SelectedOptions, db: Session = De
 
 @app.post("/upload_holidaysheet", tags=["Holiday Sheet"])
 async def upload_holidaysheet(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """Takes the csv file of holiday data as input and updates it into holiday_data table of the database."""
+    """Takes the csv file of holiday data as input and updates it into holiday_data table of the database.
+    Returns the number of rows read along with the message."""
 
     try:
-        write.save_holiday_data_to_db(file, db)
-        return MESSAGE
+        rows = write.save_holiday_data_to_db(file, db)
+        return {**MESSAGE, "rows": rows}
     except Exception as e:
         logger.error("Failed to upload holiday data")
         raise HTTPException(detail=str(e), status_code=500) from e
@@ -172,37 +224,44 @@ async def create_role(user: schemas.RoleCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/project_codes", response_model=List[str], tags=["General Data"])
-async def get_project_codes(db: Session = Depends(get_db)):
-    """API for fetching list of unique project codes and returning it."""
+async def get_project_codes(request: Request, db: Session = Depends(get_db)):
+    """API for fetching list of unique project codes and returning it, cached and with an ETag."""
     
     try:
-        return read.get_project_codes(db)
+        return cached_response(request, read_cache.PROJECT_CODES, None, lambda: read.get_project_codes(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch project codes") from e
 
 
 @app.get("/project_names", response_model=List[str], tags=["General Data"])
-async def get_project_names(db: Session = Depends(get_db)):
-    """API for fetching list of unique project names and returning it."""
+async def get_project_names(request: Request, db: Session = Depends(get_db)):
+    """API for fetching list of unique project names and returning it, cached and with an ETag."""
     
     try:
-        return read.get_project_names(db)
+        return cached_response(request, read_cache.PROJECT_NAMES, None, lambda: read.get_project_names(db))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch project names") from e
     
 
 @app.post("/get_stoxx_sheet", tags=["Stoxx Sheet"])     
-async def get_stoxx_sheet(project_code_data: schemas.StoxxSheet, db: Session = Depends(get_db)):
-    """API that takes list of project codes, month & year as an input and generates a zip file of stoxx sheet and summary sheet of the project codes in the list."""
+async def get_stoxx_sheet(project_code_data: schemas.StoxxSheet, stream: bool = False, db: Session = Depends(get_db)):
+    """API that takes list of project codes, month & year as an input and generates a zip file of stoxx sheet and summary sheet of the project codes in the list.
+    With stream=true the zip is sent project by project as it is built and the status list is
+    written into the zip as manifest.json instead of the X-Status-List header."""
     
     try:
-        zip_buffer, status_list = generate_stoxx_timesheet(project_code_data, db)
-        headers = {
-            "Content-Disposition": "attachment; filename=stoxx_sheets.zip",
-            "X-Status-List":json.dumps(status_list)
-            }
-        return StreamingResponse(
-            BytesIO(zip_buffer),
+        headers = {"Content-Disposition": "attachment; filename=stoxx_sheets.zip"}
+        if stream:
+            return StreamingResponse(
+                stream_stoxx_timesheet(project_code_data, db),
+                media_type="application/x-zip-compressed",
+                headers=headers,
+            )
+
+        zip_bytes, status_list = generate_stoxx_timesheet(project_code_data, db)
+        headers["X-Status-List"] = json.dumps(status_list)
+        return Response(
+            content=zip_bytes,
             media_type="application/x-zip-compressed",
             headers=headers,
         )
@@ -211,6 +270,62 @@ async def get_stoxx_sheet(project_code_data: schemas.StoxxSheet, db: Session = D
         raise HTTPException(detail=str(e), status_code=500) from e
     
     
+@app.get("/stoxx_roster", tags=["Stoxx Sheet"])
+async def get_stoxx_roster(month: int, year: int, project_code: List[str] = Query(None), db: Session = Depends(get_db)):
+    """API that returns the Stoxx_sheet roster of the given project codes, or of every employee of the company
+    when none is given, for a month & year. The roster is written row by row with constant memory."""
+
+    try:
+        path = write_stoxx_roster_file(month, year, db, project_code)
+    except Exception as e:
+        logger.error("Failed to generate stoxx roster")
+        raise HTTPException(detail=str(e), status_code=500) from e
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"Stoxx_sheet_{month}_{year}.xlsx",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+@app.post("/stoxx_jobs", response_model=schemas.StoxxJob, status_code=202, tags=["Stoxx Sheet"])
+async def submit_stoxx_job(project_code_data: schemas.StoxxSheet, db: Session = Depends(get_db)):
+    """API that queues the generation of the stoxx sheets of the project codes in the list
+    and returns the job, whose job_id is used to poll its status and download the zip."""
+
+    try:
+        return jobs.submit_job(project_code_data, db)
+    except Exception as e:
+        logger.error("Failed to submit stoxx job")
+        raise HTTPException(detail=str(e), status_code=500) from e
+
+
+@app.get("/stoxx_jobs/{job_id}", response_model=schemas.StoxxJob, tags=["Stoxx Sheet"])
+async def get_stoxx_job(job_id: str):
+    """API that returns the status of a stoxx job along with the progress of each project code."""
+
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(detail="Stoxx job not found", status_code=404)
+    return job
+
+
+@app.get("/stoxx_jobs/{job_id}/download", tags=["Stoxx Sheet"])
+async def download_stoxx_job(job_id: str):
+    """API that returns the zip of stoxx sheets built by a completed stoxx job."""
+
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(detail="Stoxx job not found", status_code=404)
+    if job["status"] != "completed":
+        raise HTTPException(detail=f"Stoxx job is {job['status']}", status_code=409)
+    return FileResponse(
+        jobs.result_path(job_id),
+        media_type="application/x-zip-compressed",
+        filename="stoxx_sheets.zip",
+    )
+    
+    
 @app.post("/update_time_window_status", tags=["Timesheet Window"])      
 async def update_time_window_status(time_window_data:schemas.TimeWindow,db:Session = Depends(get_db)):
     """API to freeze/unfreeze user-timesheet window and add that data into the time_window_data table."""
@@ -224,11 +339,11 @@ async def update_time_window_status(time_window_data:schemas.TimeWindow,db:Sessi
 
 
 @app.get("/get_time_window_status", tags=["Timesheet Window"])    
-async def get_time_window_status(db:Session = Depends(get_db)):
+async def get_time_window_status(request: Request, db:Session = Depends(get_db)):
     """API to get the status(freeze or unfreeze) of user-timesheet window.
-    Returns a json ({'status':'[status]'})"""
+    Returns a json ({'status':'[status]'}), cached for the current month and with an ETag."""
 
-    try:
+    def load_status():
         time_sheet_status=read.get_time_stamp(db)
         if time_sheet_status:
             if time_sheet_status.time_stamp.month != datetime.now().month:
@@ -237,6 +352,10 @@ async def get_time_window_status(db:Session = Depends(get_db)):
                 return {'status':time_sheet_status.status}
         else:
             return {'status':'Unfreeze'}
+
+    try:
+        now = datetime.now()
+        return cached_response(request, read_cache.TIME_WINDOW, (now.year, now.month), load_status)
     except Exception as e:
         logger.error("Failed to get time window")
         raise HTTPException(detail=str(e), status_code=500) from e
@@ -263,4 +382,15 @@ async def get_comp_off_data(year: int, month: int, db: Session = Depends(get_db)
    try:
        return read.fetch_compoff_data(year, month, db)
    except Exception as e:
-       raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+       raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/timesheet_summary/{year}/{month}", response_model=List[schemas.TimesheetSummary], tags=["Timesheet"])
+async def get_timesheet_summary(year: int, month: int, db: Session = Depends(get_db)):
+    """Fetch the timesheet summaries (filled, blank, leave and holiday days) of the employees
+    for a specific month and year."""
+
+    try:
+        return read.fetch_timesheet_summary_data(year, month, db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
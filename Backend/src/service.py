@@ -1,20 +1,25 @@
 """Provides the timesheet template for the current month/year"""
 import calendar
+import json
 import os
-import shutil
 from collections import defaultdict
 from datetime import datetime, timedelta
 from io import BytesIO
+from tempfile import NamedTemporaryFile
+from typing import Iterator, Optional
 from zipfile import ZipFile
 
-import openpyxl
+import numpy as np
 import pandas as pd
-from openpyxl.styles import Alignment, Border, Font, Side, numbers
 from sqlalchemy.orm import Session
 
 from src.db import db_reader as read
 from src.db.model import models
 from src.db.model.models import HolidayData, LeaveSheetData
+from src.stoxx import cache, pool, roster, templates
+from src.stoxx.roster import roster_row, stoxx_leave_days
+from src.stoxx.styles import WorkbookStyles
+from src.stoxx.templates import STOXX_SHEET_TEMPLATE, SUMMARY_TEMPLATE
 
 
 def month_number_to_name(month_number):
@@ -103,126 +108,300 @@ def create_timesheet_template(
     return template
 
 
-thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
+SUMMARY_FIRST_ROW = 9
+STOXX_SHEET_FIRST_ROW = 5
+
+# Named style of every column, starting from column A, of the rows written per employee.
+SUMMARY_ROW_STYLES = ("serial", "name", "centered", "centered", "amount", "amount", "amount",
+                      "percent", "percent", "border", "border", "border")
+SUMMARY_TRAVEL_ROW_STYLES = ("border", "border", "travel") + ("border",) * 7 + ("euro", "border")
+STOXX_SHEET_ROW_STYLES = ("cambria",) * 9 + ("border",) * 7
+
+
+def format_stoxx_timesheet(sh, styles: WorkbookStyles, first_row: int, count: int):
+    """Formats the summary rows of count employees according to template"""
+
+    last_row = first_row + 2 * count
+    styles.apply(sh, range(first_row, last_row, 2), SUMMARY_ROW_STYLES)
+    styles.apply(sh, range(first_row + 1, last_row, 2), SUMMARY_TRAVEL_ROW_STYLES)
+
+
+def format_stoxx_signatures(sh, styles: WorkbookStyles, row: int):
+    """Formats the signature lines below the summary"""
 
+    styles.apply(sh, [row], ("signature_label", "signature_line", "signature_label"), min_col=3)
+    styles.apply(sh, [row], ("signature", "signature"), min_col=10)
+    styles.apply(sh, [row + 2], ("label",), min_col=3)
+    styles.apply(sh, [row + 2], ("signature",), min_col=10)
 
-def format_stoxx_timesheet(sh,i):
-    """Formats the stoxx sheet according to template"""
-
-    sh[f"A{i}"].alignment = Alignment(horizontal="center")
-    sh[f"A{i}"].number_format = numbers.FORMAT_NUMBER
-    sh[f"A{i}"].font = Font(size=9)
-    sh[f"A{i}"].border = thin_border
-    sh[f"A{i+1}"].border = thin_border
-    sh[f"B{i}"].font = Font(size=10)
-    sh[f"B{i}"].border = thin_border
-    sh[f"B{i+1}"].border = thin_border
-    sh[f"C{i}"].alignment = Alignment(horizontal="center")
-    sh[f"C{i}"].border = thin_border
-    sh[f"C{i+1}"].alignment = Alignment(horizontal="center")
-    sh[f"C{i+1}"].font = Font(size=8)
-    sh[f"C{i+1}"].border = thin_border
-    sh[f"L{i}"].border = thin_border
-    sh[f"L{i+1}"].border = thin_border
-    sh[f"I{i}"].border = thin_border
-    sh[f"I{i+1}"].border = thin_border
-    sh[f"F{i}"].border = thin_border
-
-    sh[f"F{i+1}"].border = thin_border
-    sh[f"D{i}"].border = thin_border
-
-    sh[f"D{i+1}"].border = thin_border
-    sh[f"G{i}"].border = thin_border
-
-    sh[f"G{i+1}"].border = thin_border
-    sh[f"E{i}"].border = thin_border
-
-    sh[f"E{i+1}"].border = thin_border
-    sh[f"H{i}"].border = thin_border
-
-    sh[f"H{i+1}"].border = thin_border
-    sh[f"J{i}"].border = thin_border
-    sh[f"J{i+1}"].border = thin_border
-    sh[f"K{i}"].border = thin_border
-    sh[f"K{i+1}"].border = thin_border
-    sh[f"I{i}"].number_format = "0.00%"
-    sh[f"I{i}"].alignment = Alignment(horizontal="center")
-    sh[f"F{i}"].number_format = "#,##0.00"
-    sh[f"F{i}"].alignment = Alignment(horizontal="center")
-    sh[f"D{i}"].alignment = Alignment(horizontal="center")
-
-    sh[f"G{i}"].number_format = "#,##0.00"
-    sh[f"G{i}"].alignment = Alignment(horizontal="center")
-
-
-    sh[f"E{i}"].number_format = "#,##0.00"
-    sh[f"E{i}"].alignment = Alignment(horizontal="center")
-    sh[f"H{i}"].alignment = Alignment(horizontal="center")
-    sh[f"H{i}"].number_format = "0.00%"
-    sh[f"K{i+1}"].number_format = (
-                    '_("€"* #,##0.00_);_("€"* (#,##0.00);_("€"* "-"??_);_(@_)'
-                )
-
-
-def format_stoxx_sheet(ws,i):
-    """Formats stoxx sheet"""
-    ws[f'A{i}'].font = Font(name='Cambria',size=10)
-    ws[f'B{i}'].font = Font(name='Cambria',size=10)
-    ws[f'C{i}'].font = Font(name='Cambria',size=10)
-    ws[f'D{i}'].font = Font(name='Cambria',size=10)
-    ws[f'E{i}'].font = Font(name='Cambria',size=10)
-    ws[f'F{i}'].font = Font(name='Cambria',size=10)
-    ws[f'G{i}'].font = Font(name='Cambria',size=10)
-    ws[f'H{i}'].font = Font(name='Cambria',size=10)
-    ws[f'I{i}'].font = Font(name='Cambria',size=10)
-    ws[f"A{i}"].border = thin_border
-    ws[f"B{i}"].border = thin_border
-    ws[f"C{i}"].border = thin_border
-    ws[f"D{i}"].border = thin_border
-    ws[f"E{i}"].border = thin_border
-    ws[f"F{i}"].border = thin_border
-    ws[f"G{i}"].border = thin_border
-    ws[f"H{i}"].border = thin_border
-    ws[f"I{i}"].border = thin_border
-    ws[f"J{i}"].border = thin_border
-    ws[f"K{i}"].border = thin_border
-    ws[f"L{i}"].border = thin_border
-    ws[f"M{i}"].border = thin_border
-    ws[f"N{i}"].border = thin_border
-    ws[f"O{i}"].border = thin_border
-    ws[f"P{i}"].border = thin_border
+
+def format_stoxx_sheet(ws, styles: WorkbookStyles, first_row: int, count: int):
+    """Formats the stoxx sheet rows of count employees"""
+
+    styles.apply(ws, range(first_row, first_row + count), STOXX_SHEET_ROW_STYLES)
 
 
 def generate_stoxx_sheet(user,i,ws,leave_days):
     """Generate stoxx sheet"""
     
-    proj_code=user.project_code.project_code
-    ws['A2'] = user.team.team
-    ws[f'A{i+4}'].value = i
-    ws[f'B{i+4}'] = user.first_name
-    ws[f'C{i+4}'] = user.last_name
-    ws[f'D{i+4}'] = str(user.first_name + " " + user.last_name)
-    ws[f'E{i+4}'] = user.hr_code
-    ws[f'F{i+4}'] = user.team.team
-    ws[f'G{i+4}'] = user.start_date
-    ws[f'H{i+4}'] = user.level.level
-    ws[f'I{i+4}'] = proj_code
-    l=len(leave_days)
-    if l == 0:
-        ws[f'K{i+4}'] = '-'
-    elif l == 1:
-        days = str(tuple(leave_days))
-        days = days.replace(',','')
-        ws[f'K{i+4}'] = str(l) + " Day " + days
-    else:
-        days = str(tuple(leave_days))
-        ws[f'K{i+4}'] = str(l) + " Days " + days
-    format_stoxx_sheet(ws,i+4)
+    ws['A2'] = user["team"]
+    for column, value in enumerate(roster_row(i, user, leave_days), 1):
+        if value is not None:
+            ws.cell(row=i + 4, column=column, value=value)
+
+
+STOXX_TIMESHEET_FIRST_ROW = 14
+# Columns of the employee sheet filled from each timesheet entry, in the order of the row values.
+STOXX_TIMESHEET_FIELDS = ("work_description", "IN", "OUT", "status", "total_hrs", "break_hrs", "working_day")
+STOXX_TIMESHEET_COLUMNS = (13, 2, 3, 9, 5, 4, 7)
+
+
+def stoxx_timesheet_rows(user_list: list) -> list:
+    """Derives the IN/OUT/total_hrs/break_hrs/working_day columns of the employee sheets of a project
+    in a single vectorized pass over the timesheet entries of all its employees.
+    The first entry of a timesheet only fills the description of the sheet, so it is not written.
+    Returns, for every employee, the (row, values) pairs to write into its sheet along with
+    its count of working days and of leave days."""
+
+    records = [
+        (n, position, entry["day_of_month"], entry["work_description"], entry["status"])
+        for n, user in enumerate(user_list)
+        for position, entry in enumerate(user["timesheet"])
+        if position
+    ]
+    df = pd.DataFrame.from_records(
+        records, columns=["employee", "position", "day_of_month", "work_description", "status"]
+    )
+
+    blank = (df["status"].isnull() | (df["status"] == "")).to_numpy()
+    df["IN"] = np.where(blank, "10:00", "")
+    df["OUT"] = np.where(blank, "19:00", "")
+    df["break_hrs"] = np.where(blank, "0:30", "")
+    total_hrs = np.full(len(df), "", dtype=object)
+    total_hrs[blank] = 8.00
+    df["total_hrs"] = total_hrs
+    df["status"] = df["status"].mask(df["status"].isin(["Saturday", "Sunday"]), "")
+    df["working_day"] = blank.astype(int)
+    df["leave"] = (df["status"] == "Leave").astype(int)
+
+    totals = (
+        df.groupby("employee")[["working_day", "leave"]].sum()
+        .reindex(range(len(user_list)), fill_value=0)
+        .astype(int)
+    )
+    working_days = totals["working_day"].to_numpy()
+    leave_days = totals["leave"].to_numpy()
+
+    row_numbers = (STOXX_TIMESHEET_FIRST_ROW + df["position"]).tolist()
+    values = list(zip(*(df[field].tolist() for field in STOXX_TIMESHEET_FIELDS)))
+    rows = list(zip(row_numbers, values))
+    bounds = np.searchsorted(df["employee"].to_numpy(), np.arange(len(user_list) + 1))
+    return [
+        (rows[bounds[n]:bounds[n + 1]], working_days[n], leave_days[n])
+        for n in range(len(user_list))
+    ]
+
+
+def build_stoxx_workbooks(project_code: str, user_list: list, month: int, year: int):
+    """Builds the summary workbook and the stoxx sheet of one project code in memory.
+    Returns the serialized Template_stoxx and Stoxx_sheet workbooks along with the names of
+    the employees who have not filled the timesheet."""
+
+    not_filled = []
+
+    wbx = templates.get_template(STOXX_SHEET_TEMPLATE).new_workbook()
+    wsx = wbx["stoxx_sheet"]
+    wsx.title = project_code
+    wsx = wbx[project_code]
+
+    summary_template = templates.get_template(SUMMARY_TEMPLATE)
+    wb = summary_template.new_workbook()
+    wb.remove(wb["stoxx_sheet_template"])
+    sheet_template = summary_template.sheets["stoxx_sheet_template"]
+    summary_styles = WorkbookStyles(wb)
+
+    timesheet_rows = stoxx_timesheet_rows(user_list)
+    sh = wb["Summary"]
+    i = SUMMARY_FIRST_ROW
+    j = 1
+    for user in user_list:
+
+        ws = sheet_template.clone(wb, str(user["hr_code"]))
+
+        sh[f"A{i}"].value = j
+        sh[f"B{i}"] = str(user["hr_code"])
+        ws["C6"] = str(user["first_name"] + " " + user["last_name"])
+        sh[f"C{i}"] = ws["C6"].value
+        sh[f"C{i+1}"] = "Travel"
+        ws["J2"] = str(str(month_number_to_name(month)) + "," + str(year))
+        sh["E3"] = str(str(month_number_to_name(month)) + "," + str(year))
+        sh["E8"] = str(str(month_number_to_name(month)) + "," + str(year))
+        ws["C8"] = user["project_number"]
+        ws["I4"] = user["manager"]
+        ws["I6"] = user["department"]
+        ws["I10"] = user["project_name"]
+        sh["E4"] = user["project_name"]
+        timesheet_data = user["timesheet"]
+        ws.sheet_view.showGridLines = False
+
+        if j == len(user_list):
+            i = i + 4
+            sh[f"C{i}"] = "Name"
+            sh[f"E{i}"] = "Date"
+            sh[f"J{i}"] = "Name"
+            sh[f"K{i}"] = "Date"
+            i = i + 2
+            sh[f"C{i}"] = "Signature indxx line manager"
+            sh[f"J{i}"] = "Signature STOXX line manager"
+            format_stoxx_signatures(sh, summary_styles, i - 2)
+            i = i - 6
+
+        if not timesheet_data:
+            not_filled.append(str(user["first_name"] + " " + user["last_name"]))
+            i = i + 2
+            leave_days = []
+            generate_stoxx_sheet(user,j,wsx,leave_days)
+            j = j + 1
+            continue
+        ws["L4"] = str(timesheet_data[0]["work_description"])
+        sh[f"L{i}"] = ws["L4"].value
+        sh[f"I{i}"].value = 1
+
+        rows, count, leaves_count = timesheet_rows[j - 1]
+        for row, values in rows:
+            for column, value in zip(STOXX_TIMESHEET_COLUMNS, values):
+                ws.cell(row=row, column=column, value=value)
+
+        ws["G48"] = count
+        ws["E48"] = 8 * count
+        ws["E50"] = count
+        ws["G50"] = count
+        ws["D57"] = count
+        ws["D58"] = -count
+
+        sh[f"F{i}"] = ws["E50"].value
+
+        sh[f"D{i}"] = ws["E48"].value
+
+        sh[f"G{i}"] = ws["G50"].value
+
+        sh[f"E{i}"] = count + leaves_count
+
+        sh[f"H{i}"] = count / (count + leaves_count)
+        if sh[f"J{i+1}"].value is not None and sh[f"I{i+1}"].value is not None:
+            sh[f"K{i+1}]"].value = int(sh[f"J{i+1}"].value) * int(
+                sh[f"I{i+1}"].value
+            )
+        else:
+            sh[f"K{i+1}"].value = 0
+
+        i = i + 2
+        generate_stoxx_sheet(user,j,wsx,stoxx_leave_days(timesheet_data))
+        j = j + 1
+
+    format_stoxx_timesheet(sh, summary_styles, SUMMARY_FIRST_ROW, len(user_list))
+    format_stoxx_sheet(wsx, WorkbookStyles(wbx), STOXX_SHEET_FIRST_ROW, len(user_list))
+    return save_workbook(wb), save_workbook(wbx), not_filled
+
+
+def save_workbook(wb) -> bytes:
+    """Serializes the workbook into xlsx bytes."""
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+class ZipSink:
+    """Write-only file object for ZipFile that hands over the bytes written so far,
+    letting the archive be sent out while it is still being written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        """Returns and forgets everything written since the last call."""
+
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def load_stoxx_data(db: Session, project_code_list: list, month: int, year: int):
+    """Loads the employees of the provided project codes along with the fingerprint of the data
+    each project's workbooks are built from. Returns (stoxx_data, fingerprints)."""
+
+    stoxx_data = read.get_stoxx_employee_data(db, project_code_list, month, year)
+    leave_data = read.get_stoxx_leave_data(db, project_code_list, month, year)
+    holidays = read.get_month_holidays(db, month, year)
+    fingerprints = {
+        project_code: cache.fingerprint(stoxx_data[project_code], leave_data.get(project_code, []), holidays)
+        for project_code in project_code_list
+    }
+    return stoxx_data, fingerprints
+
+
+def write_stoxx_projects(zf: ZipFile, project_code_list: list, stoxx_data: dict, month: int, year: int,
+                         fingerprints: Optional[dict] = None):
+    """Writes the workbooks of every project code into the zip as soon as they are built.
+    Projects whose data fingerprint matches a cache entry are taken from the cache, the others
+    are built and cached.
+    Yields each project code with the names of its employees who have not filled the timesheet."""
+
+    fingerprints = fingerprints or {}
+    cached = {
+        project_code: cache.get(project_code, month, year, fingerprints[project_code])
+        for project_code in project_code_list
+        if project_code in fingerprints
+    }
+    tasks = [
+        (project_code, stoxx_data[project_code], month, year)
+        for project_code in project_code_list
+        if cached.get(project_code) is None
+    ]
+    results = pool.map_projects(build_stoxx_workbooks, tasks)
+    for project_code in project_code_list:
+        workbooks = cached.get(project_code)
+        if workbooks is None:
+            workbooks = next(results)
+            if project_code in fingerprints:
+                cache.put(project_code, month, year, fingerprints[project_code], workbooks)
+        template_xlsx, stoxx_xlsx, not_filled = workbooks
+        zf.writestr(f"{project_code}/Template_stoxx_{project_code}.xlsx", template_xlsx)
+        zf.writestr(f"{project_code}/Stoxx_sheet_{project_code}.xlsx", stoxx_xlsx)
+        yield project_code, not_filled
+
+
+def write_stoxx_roster_file(month: int, year: int, db: Session, project_code_list: Optional[list] = None) -> str:
+    """Writes the Stoxx_sheet roster of every employee of the given project codes, or of the whole
+    company, into a temporary xlsx file while streaming the employees from the database.
+    Returns the path of the file, which is to be removed by the caller."""
+
+    users = read.iter_stoxx_employee_data(db, month, year, project_code_list)
+    with NamedTemporaryFile(suffix=".xlsx", delete=False) as roster_file:
+        try:
+            roster.write_stoxx_roster(users, roster_file)
+        except Exception:
+            roster_file.close()
+            os.remove(roster_file.name)
+            raise
+    return roster_file.name
+
+
+def stoxx_status_list(status_dict: dict) -> list:
+    """Converts the employees who have not filled the timesheet, per project code, into the status list."""
+
+    if not status_dict:
+        return [{"details": "Generated successfully"}]
+    return [{"details": f"{proj_code}: {', '.join(indxx_ids)} have not filled the timesheet"}
+            for proj_code, indxx_ids in status_dict.items()]
 
 
 def generate_stoxx_timesheet(project_code_data, db: Session):
@@ -232,191 +411,36 @@ def generate_stoxx_timesheet(project_code_data, db: Session):
     month = project_code_data.month
     year = project_code_data.year
     status_dict = defaultdict(list)
-    upper_border = Border(top=Side(style="thin"))
+    stoxx_data, fingerprints = load_stoxx_data(db, project_code_list, month, year)
     zip_buffer = BytesIO()
     with ZipFile(zip_buffer, "w") as zf:
-        for project_code in project_code_list:
-            proj_code_query = (
-                db.query(models.EmployeeData)
-                .join(models.ProjectCodeData)
-                .filter(models.ProjectCodeData.project_code == project_code)
-            )
-            ofpx = "data/Stoxx_sheet_template.xlsx"
-            nfpx = f"data/Stoxx_sheet_{project_code}.xlsx"
-            if not os.path.exists(nfpx):
-                shutil.copyfile(ofpx, nfpx)
-            wbx = openpyxl.load_workbook(nfpx)
-            wsx = wbx["stoxx_sheet"]
-            wsx.title = project_code
-            wsx = wbx[project_code]
-
-            ofp = "data/Template_stoxx.xlsx"
-            nfp = f"data/Template_stoxx_{project_code}.xlsx"
-            if not os.path.exists(nfp):
-                shutil.copyfile(ofp, nfp)
-            wb = openpyxl.load_workbook(nfp)
-
-            ws = wb["stoxx_sheet_template"]
-            user_list = list(proj_code_query)
-            for i in range(len(user_list)):
-                wb.copy_worksheet(ws)
-
-            ws = wb["stoxx_sheet_template Copy"]
-            ws.title = "stoxx_sheet_template Copy0"
-
-            wb.remove(wb["stoxx_sheet_template"])
-
-            i = 9
-            j = 1
-            for user in proj_code_query:
-
-                sh = wb["Summary"]
-                ws = wb[f"stoxx_sheet_template Copy{j-1}"]
-
-                sh[f"A{i}"].value = j
-                ws.title = str(user.hr_code)
-                sh[f"B{i}"] = str(user.hr_code)
-                ws["C6"] = str(user.first_name + " " + user.last_name)
-                sh[f"C{i}"] = ws["C6"].value
-                sh[f"C{i+1}"] = "Travel"
-                ws["J2"] = str(str(month_number_to_name(month)) + "," + str(year))
-                sh["E3"] = str(str(month_number_to_name(month)) + "," + str(year))
-                sh["E8"] = str(str(month_number_to_name(month)) + "," + str(year))
-                ws["C8"] = user.project_number.project_number
-                ws["I4"] = user.manager.manager
-                ws["I6"] = user.department.department
-                ws["I10"] = user.project_name.project_name
-                sh["E4"] = user.project_name.project_name
-                timesheet_data = read.get_timesheet_by_indxx_id_and_date(
-                    db, str(user.indxx_id), month, year
-                )
-                ws.sheet_view.showGridLines = False
-                format_stoxx_timesheet(sh,i)
-
-                if j == len(user_list):
-                    i = i + 4
-                    sh[f"C{i}"].border = upper_border
-                    sh[f"D{i}"].border = upper_border
-                    sh[f"E{i}"].border = upper_border
-
-                    sh[f"C{i}"] = "Name"
-                    sh[f"C{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"E{i}"] = "Date"
-                    sh[f"E{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"J{i}"] = "Name"
-                    sh[f"J{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"J{i}"].font = Font(size=10)
-
-                    sh[f"K{i}"] = "Date"
-                    sh[f"K{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"K{i}"].font = Font(size=10)
-
-                    i = i + 2
-
-                    sh[f"C{i}"] = "Signature indxx line manager"
-                    sh[f"C{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"J{i}"] = "Signature STOXX line manager"
-                    sh[f"J{i}"].alignment = Alignment(horizontal="left")
-                    sh[f"J{i}"].font = Font(size=10)
-                    i = i - 6
-
-                if not timesheet_data:
-                    status_dict[project_code].append(str(user.first_name + " " + user.last_name))
-                    wb.save(
-                        f"data/Template_stoxx_{user.project_code.project_code}.xlsx"
-                    )
-                    i = i + 2
-                    leave_days = []
-                    generate_stoxx_sheet(user,j,wsx,leave_days)
-                    wb.save(nfp)
-                    wbx.save(nfpx)
-                    j = j + 1
-                    continue
-                df = pd.DataFrame(timesheet_data)
-                ws["L4"] = str(df.loc[0]["work_description"])
-                sh[f"L{i}"] = ws["L4"].value
-                sh[f"I{i}"].value = 1
-                df = df.reset_index(drop=True)
-                df = df.drop(0)
-
-                df["IN"] = ""
-                df.loc[df["status"].isnull() | (df["status"] == ""), "IN"] = "10:00"
-                df["OUT"] = ""
-                df.loc[df["status"].isnull() | (df["status"] == ""), "OUT"] = "19:00"
-                df["total_hrs"] = ""
-                df.loc[df["status"].isnull() | (df["status"] == ""), "total_hrs"] = (
-                    8.00
-                )
-                df["break_hrs"] = ""
-                df.loc[df["status"].isnull() | (df["status"] == ""), "break_hrs"] = (
-                    "0:30"
-                )
-
-                df["status"].replace({"Saturday": "", "Sunday": ""}, inplace=True)
-                df["working_day"] = 0
-                df.loc[df["IN"] != "", "working_day"] = 1
-                leave_days = df[df['status'] == 'Leave']['day_of_month'].to_list()
-                leaves_count = df["status"].value_counts().get("Leave", 0)
-
-                startrow = 14
-                startcols = {
-                    "work_description": 12,
-                    "IN": 1,
-                    "OUT": 2,
-                    "status": 8,
-                    "total_hrs": 4,
-                    "break_hrs": 3,
-                    "working_day": 6,
-                }
-
-                for idx, row in df.iterrows():
-                    for col, startcol in startcols.items():
-                        value = row[col]
-                        cell_row = startrow + int(idx)
-                        cell_col = startcol + 1
-                        ws.cell(row=cell_row, column=cell_col, value=value)
-                  
-                count = df["working_day"].sum()
-
-                ws["G48"] = count
-                ws["E48"] = 8 * count
-                ws["E50"] = count
-                ws["G50"] = count
-                ws["D57"] = count
-                ws["D58"] = -count
-
-                sh[f"F{i}"] = ws["E50"].value
-
-                sh[f"D{i}"] = ws["E48"].value
-
-                sh[f"G{i}"] = ws["G50"].value
-
-                sh[f"E{i}"] = count + leaves_count
-
-                sh[f"H{i}"] = count / (count + leaves_count)
-                if sh[f"J{i+1}"].value is not None and sh[f"I{i+1}"].value is not None:
-                    sh[f"K{i+1}]"].value = int(sh[f"J{i+1}"].value) * int(
-                        sh[f"I{i+1}"].value
-                    )
-                else:
-                    sh[f"K{i+1}"].value = 0
-
-                i = i + 2
-                generate_stoxx_sheet(user,j,wsx,leave_days)
-                wbx.save(nfpx)
-                j = j + 1
-                wb.save(nfp)
-            
-            
-            zf.write(nfp, os.path.join(project_code,os.path.basename(nfp)))
-            zf.write(nfpx, os.path.join(project_code,os.path.basename(nfpx)))
-            os.remove(nfp)
-            os.remove(nfpx)
-    zip_buffer.seek(0)
-    if not status_dict:
-        status_list = []
-        status_list.append({"details": "Generated successfully"})
-    else:
-        status_list = [{"details": f"{proj_code}: {', '.join(indxx_ids)} have not filled the timesheet"}
-                  for proj_code, indxx_ids in status_dict.items()]
-    return zip_buffer.getvalue(), status_list
\ No newline at end of file
+        for project_code, not_filled in write_stoxx_projects(zf, project_code_list, stoxx_data, month, year,
+                                                             fingerprints):
+            if not_filled:
+                status_dict[project_code].extend(not_filled)
+    return zip_buffer.getvalue(), stoxx_status_list(status_dict)
+
+
+def stream_stoxx_timesheet(project_code_data, db: Session) -> Iterator[bytes]:
+    """Loads the data of the provided project codes and returns an iterator over the zip of
+    their stoxx sheets. Each project is sent as soon as it is built and the per-project status
+    is written last into the zip as manifest.json, so nothing has to be known up front."""
+
+    project_code_list = project_code_data.project_code
+    month = project_code_data.month
+    year = project_code_data.year
+    stoxx_data, fingerprints = load_stoxx_data(db, project_code_list, month, year)
+
+    def archive():
+        status_dict = defaultdict(list)
+        sink = ZipSink()
+        with ZipFile(sink, "w") as zf:
+            for project_code, not_filled in write_stoxx_projects(zf, project_code_list, stoxx_data, month, year,
+                                                                 fingerprints):
+                if not_filled:
+                    status_dict[project_code].extend(not_filled)
+                yield sink.drain()
+            zf.writestr("manifest.json", json.dumps(stoxx_status_list(status_dict)))
+        yield sink.drain()
+
+    return archive()
@@ -0,0 +1,71 @@
+"""On-disk cache of the stoxx workbooks built for a project code and month.
+
+STOXX_CACHE_DIR holds one entry per (project_code, month, year) with the workbooks built for it
+and the fingerprint of the data they were built from: the employee rows with their timesheet
+entries, the leave rows and the holidays of the month. An entry is only reused while the
+fingerprint of the current data matches, so a project is rebuilt as soon as its data changes."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from typing import Optional
+
+from src.stoxx import templates
+from src.stoxx.templates import STOXX_SHEET_TEMPLATE, SUMMARY_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("STOXX_CACHE_DIR", "data/stoxx_cache")
+# Part of every fingerprint, to be bumped whenever the layout of the built workbooks changes.
+CACHE_VERSION = 1
+
+
+def fingerprint(employees: list, leaves: list, holidays: list) -> str:
+    """Hash of the data a project's workbooks are built from, along with the templates used."""
+
+    template_mtimes = [templates.get_template(path).mtime for path in (SUMMARY_TEMPLATE, STOXX_SHEET_TEMPLATE)]
+    data = [CACHE_VERSION, template_mtimes, employees, leaves, holidays]
+    return hashlib.sha256(json.dumps(data, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def entry_path(project_code: str, month: int, year: int) -> str:
+    """Path of the cache entry of the project code and month."""
+
+    key = hashlib.sha256(f"{project_code}|{month}|{year}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+
+def get(project_code: str, month: int, year: int, data_fingerprint: str) -> Optional[tuple]:
+    """Returns the workbooks cached for the project code and month if they were built from data
+    with the same fingerprint, None otherwise."""
+
+    try:
+        with open(entry_path(project_code, month, year), "rb") as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+        logger.warning("Ignoring unreadable stoxx cache entry of %s: %s", project_code, e)
+        return None
+    if entry["fingerprint"] != data_fingerprint:
+        return None
+    return entry["workbooks"]
+
+
+def put(project_code: str, month: int, year: int, data_fingerprint: str, workbooks: tuple):
+    """Atomically stores the workbooks built for the project code and month, replacing the
+    entry built from older data. Failing to store them only costs a rebuild, so it is logged."""
+
+    path = entry_path(project_code, month, year)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"fingerprint": data_fingerprint, "workbooks": workbooks}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not cache the stoxx workbooks of %s: %s", project_code, e)
@@ -0,0 +1,230 @@
+"""Background jobs that generate the stoxx sheet zip outside the request.
+
+A job is submitted with the data of its project codes already loaded, built by a local thread
+pool and tracked on disk: STOXX_JOB_DIR holds a <job_id>.json state file and, once the job is
+done, the <job_id>.zip artifact. Jobs older than STOXX_JOB_TTL seconds are evicted.
+Every state records the process that owns the job: a job still queued or running when its process
+is gone, or that its own process no longer runs, is reported as failed instead of being polled forever."""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from zipfile import ZipFile
+
+from sqlalchemy.orm import Session
+
+from src.service import load_stoxx_data, stoxx_status_list, write_stoxx_projects
+
+logger = logging.getLogger(__name__)
+
+JOB_DIR = os.getenv("STOXX_JOB_DIR", "data/jobs")
+JOB_TTL = int(os.getenv("STOXX_JOB_TTL", str(6 * 60 * 60)))
+JOB_WORKERS = int(os.getenv("STOXX_JOB_WORKERS", "2"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_state_lock = threading.RLock()
+# Jobs submitted by this process and not done yet.
+_live_jobs: Dict[str, Future] = {}
+# Identifies this process in the job states, even if its pid is reused after a restart.
+PROCESS_ID = uuid.uuid4().hex
+UNFINISHED = ("queued", "running")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared job pool, starting it on first use."""
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="stoxx-job")
+    return _executor
+
+
+def shutdown():
+    """Stops the job pool if it was started, dropping the jobs still queued and recording them as failed."""
+
+    global _executor
+    if _executor is not None:
+        with _state_lock:
+            live_jobs = dict(_live_jobs)
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        for job_id, future in live_jobs.items():
+            if future.cancelled():
+                update_state(job_id, status="failed", error="Cancelled by the server shutdown", finished_at=time.time())
+
+
+def process_alive(pid: int) -> bool:
+    """Whether a process with the pid is running."""
+
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; jobs of other processes are trusted there.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_orphaned(job: dict) -> bool:
+    """Whether the job is queued or running although no process is building it anymore."""
+
+    if job["status"] not in UNFINISHED:
+        return False
+    owner, pid = job.get("owner"), job.get("pid")
+    if owner == PROCESS_ID:
+        with _state_lock:
+            return job["job_id"] not in _live_jobs
+    if pid is None or pid == os.getpid():
+        return True
+    return not process_alive(pid)
+
+
+def fail_orphaned_jobs():
+    """Records as failed every queued or running job left by a process that is gone."""
+
+    if not os.path.isdir(JOB_DIR):
+        return
+    for name in os.listdir(JOB_DIR):
+        if name.endswith(".json"):
+            get_job(name[:-len(".json")])
+
+
+def state_path(job_id: str) -> str:
+    """Path of the state file of the job."""
+
+    return os.path.join(JOB_DIR, f"{job_id}.json")
+
+
+def result_path(job_id: str) -> str:
+    """Path of the zip built by the job."""
+
+    return os.path.join(JOB_DIR, f"{job_id}.zip")
+
+
+def write_state(job: dict):
+    """Atomically writes the state file of the job."""
+
+    tmp_path = state_path(job["job_id"]) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    os.replace(tmp_path, state_path(job["job_id"]))
+
+
+def update_state(job_id: str, **changes) -> dict:
+    """Applies the changes to the stored state of the job and returns the new state."""
+
+    with _state_lock:
+        job = get_job(job_id)
+        job.update(changes)
+        write_state(job)
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Reads the state of the job, None if the job is unknown or was evicted.
+    A job left queued or running by a process that is gone is recorded as failed."""
+
+    if not job_id.isalnum():
+        return None
+    with _state_lock:
+        try:
+            with open(state_path(job_id), encoding="utf-8") as f:
+                job = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if is_orphaned(job):
+            logger.warning("Stoxx job %s was left %s by a stopped process", job_id, job["status"])
+            job.update(status="failed", error="Interrupted by a server restart", finished_at=time.time())
+            write_state(job)
+        return job
+
+
+def evict_expired_jobs(now: Optional[float] = None):
+    """Deletes the state and artifacts of every job left untouched for more than JOB_TTL seconds."""
+
+    now = now or time.time()
+    if not os.path.isdir(JOB_DIR):
+        return
+    for name in os.listdir(JOB_DIR):
+        path = os.path.join(JOB_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > JOB_TTL:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+
+
+def run_job(job_id: str, project_code_list: list, stoxx_data: Dict[str, list], month: int, year: int,
+            fingerprints: Dict[str, str]):
+    """Builds the zip of the job project by project, recording the progress in its state file."""
+
+    update_state(job_id, status="running")
+    part_path = result_path(job_id) + ".part"
+    status_dict = defaultdict(list)
+    try:
+        with ZipFile(part_path, "w") as zf:
+            for project_code, not_filled in write_stoxx_projects(zf, project_code_list, stoxx_data, month, year,
+                                                                 fingerprints):
+                if not_filled:
+                    status_dict[project_code].extend(not_filled)
+                with _state_lock:
+                    job = get_job(job_id)
+                    job["projects"][project_code] = "completed"
+                    write_state(job)
+        os.replace(part_path, result_path(job_id))
+        update_state(job_id, status="completed", status_list=stoxx_status_list(status_dict), finished_at=time.time())
+    except Exception as e:
+        logger.error("Stoxx job %s failed: %s", job_id, e)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        update_state(job_id, status="failed", error=str(e), finished_at=time.time())
+
+
+def submit_job(project_code_data, db: Session) -> dict:
+    """Loads the data of the provided project codes, queues the job that builds their stoxx
+    sheets and returns its initial state."""
+
+    os.makedirs(JOB_DIR, exist_ok=True)
+    evict_expired_jobs()
+
+    project_code_list = project_code_data.project_code
+    month = project_code_data.month
+    year = project_code_data.year
+    stoxx_data, fingerprints = load_stoxx_data(db, project_code_list, month, year)
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "month": month,
+        "year": year,
+        "projects": {project_code: "pending" for project_code in project_code_list},
+        "status_list": None,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+        "owner": PROCESS_ID,
+        "pid": os.getpid(),
+    }
+    with _state_lock:
+        write_state(job)
+        future = get_executor().submit(run_job, job["job_id"], project_code_list, stoxx_data, month, year,
+                                       fingerprints)
+        _live_jobs[job["job_id"]] = future
+    future.add_done_callback(lambda _: forget_job(job["job_id"]))
+    return job
+
+
+def forget_job(job_id: str):
+    """Removes the job from the jobs live in this process."""
+
+    with _state_lock:
+        _live_jobs.pop(job_id, None)
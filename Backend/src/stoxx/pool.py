@@ -0,0 +1,93 @@
+"""Process pool that builds the stoxx workbooks of several project codes in parallel.
+
+The number of worker processes is read from the STOXX_MAX_WORKERS environment variable and
+defaults to the number of CPUs; a value of 1 builds every project in the calling process."""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.stoxx import templates
+
+logger = logging.getLogger(__name__)
+
+STOXX_MAX_WORKERS = int(os.getenv("STOXX_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+# Guards the creation and replacement of the pool, used by the request and stoxx job threads alike.
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Returns the shared worker pool, starting it on first use."""
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            logger.info("Starting stoxx worker pool with %s processes", STOXX_MAX_WORKERS)
+            _executor = ProcessPoolExecutor(
+                max_workers=STOXX_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=templates.warm,
+            )
+        return _executor
+
+
+def discard_executor(executor: ProcessPoolExecutor):
+    """Drops the broken worker pool, so that the next call to get_executor starts a new one.
+    Does nothing if the pool was already replaced."""
+
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        _executor = None
+    logger.warning("Discarding the broken stoxx worker pool")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    """Stops the worker pool if it was started."""
+
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+
+
+def map_projects(func: Callable, tasks: List[Tuple]) -> Iterator:
+    """Runs func(*task) for every task and yields the results in the order of the tasks.
+    Tasks must hold plain, picklable data. At most twice as many tasks as there are workers
+    are in flight at a time, so finished results do not pile up ahead of the consumer.
+    A pool broken by a dying worker is discarded before the error is raised, so the next call starts a new one."""
+
+    if STOXX_MAX_WORKERS <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    executor = get_executor()
+    pending = deque()
+    remaining = iter(tasks)
+    try:
+        for task in remaining:
+            pending.append(executor.submit(func, *task))
+            if len(pending) >= 2 * STOXX_MAX_WORKERS:
+                break
+        while pending:
+            yield pending.popleft().result()
+            task = next(remaining, None)
+            if task is not None:
+                pending.append(executor.submit(func, *task))
+    except BrokenProcessPool:
+        discard_executor(executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,122 @@
+"""Constant-memory writer of the Stoxx_sheet roster workbook.
+
+The roster is written with a write-only openpyxl workbook: the header rows and the column
+styles are taken from the stoxx sheet template once, then every employee row is streamed to
+disk as soon as it is written, so rosters covering the whole company keep a flat memory usage."""
+
+from copy import copy
+from typing import BinaryIO, Iterable, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.cell_style import StyleArray
+
+from src.stoxx import templates
+from src.stoxx.styles import STYLES
+from src.stoxx.templates import STOXX_SHEET_TEMPLATE
+
+HEADER_ROWS = 4
+ROSTER_COLUMNS = 16
+# Named style of every roster column, starting from column A.
+ROSTER_STYLES = ("cambria",) * 9 + ("border",) * 7
+CELL_STYLE_ATTRIBUTES = ("font", "fill", "border", "alignment", "number_format", "protection")
+
+
+def stoxx_leave_days(timesheet_data: List[dict]) -> list:
+    """Days of the month on leave as listed in the roster, from the timesheet entries
+    written to the employee sheet (every entry after the first one)."""
+
+    return [entry["day_of_month"] for entry in timesheet_data[1:] if entry["status"] == "Leave"]
+
+
+def leave_days_text(leave_days: list) -> str:
+    """Describes the leave days of an employee, e.g. "2 Days (3, 4)"."""
+
+    count = len(leave_days)
+    if count == 0:
+        return "-"
+    days = str(tuple(leave_days))
+    if count == 1:
+        return str(count) + " Day " + days.replace(",", "")
+    return str(count) + " Days " + days
+
+
+def roster_row(serial: int, user: dict, leave_days: list) -> tuple:
+    """Values of the roster row of an employee, starting from column A."""
+
+    return (
+        serial,
+        user["first_name"],
+        user["last_name"],
+        str(user["first_name"] + " " + user["last_name"]),
+        user["hr_code"],
+        user["team"],
+        user["start_date"],
+        user["level"],
+        user["project_code"],
+        None,
+        leave_days_text(leave_days),
+    )
+
+
+def copy_cell_style(source, target):
+    """Copies the style of a template cell into a cell of another workbook."""
+
+    for attribute in CELL_STYLE_ATTRIBUTES:
+        setattr(target, attribute, copy(getattr(source, attribute)))
+
+
+def column_styles(template_ws, ws) -> List[StyleArray]:
+    """Style of every roster column in the write-only sheet: the style of the first employee
+    row of the template with the named roster style applied on top of it."""
+
+    styles = []
+    for column, name in enumerate(ROSTER_STYLES, 1):
+        cell = WriteOnlyCell(ws)
+        copy_cell_style(template_ws.cell(row=HEADER_ROWS + 1, column=column), cell)
+        for attribute, value in STYLES[name].items():
+            setattr(cell, attribute, value)
+        styles.append(cell._style)
+    return styles
+
+
+def write_stoxx_roster(users: Iterable[dict], fileobj: BinaryIO, title: str = "stoxx_sheet",
+                       team: Optional[str] = None):
+    """Writes the roster of the given employees, each with its "timesheet" entries, as an xlsx
+    workbook into fileobj. The employees are consumed one at a time, so they can be streamed
+    straight from the database. team is shown under the title of the sheet."""
+
+    template_ws = templates.get_template(STOXX_SHEET_TEMPLATE).new_workbook()["stoxx_sheet"]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    # Only the sizes are copied, the style ids of the dimensions belong to the template.
+    for key, dim in template_ws.column_dimensions.items():
+        ws.column_dimensions[key].width = dim.width
+    for idx in range(1, HEADER_ROWS + 1):
+        dim = template_ws.row_dimensions.get(idx)
+        if dim is not None and dim.height is not None:
+            ws.row_dimensions[idx].height = dim.height
+    ws.sheet_format = copy(template_ws.sheet_format)
+
+    for row in template_ws.iter_rows(min_row=1, max_row=HEADER_ROWS, max_col=ROSTER_COLUMNS):
+        cells = []
+        for source in row:
+            value = team if source.coordinate == "A2" else source.value
+            cell = WriteOnlyCell(ws, value=value)
+            copy_cell_style(source, cell)
+            cells.append(cell)
+        ws.append(cells)
+
+    styles = column_styles(template_ws, ws)
+    for serial, user in enumerate(users, 1):
+        values = roster_row(serial, user, stoxx_leave_days(user["timesheet"]))
+        values = values + (None,) * (ROSTER_COLUMNS - len(values))
+        cells = []
+        for value, style in zip(values, styles):
+            cell = WriteOnlyCell(ws, value=value)
+            cell._style = StyleArray(style)
+            cells.append(cell)
+        ws.append(cells)
+
+    wb.save(fileobj)
@@ -0,0 +1,89 @@
+"""Shared cell styles of the stoxx workbooks.
+
+Every style is a named set of formatting attributes, added to the style table of a workbook
+once and then applied to whole ranges of cells. Unlike an openpyxl NamedStyle it only replaces
+the attributes it sets, so the fills and number formats of the templates are kept."""
+
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from openpyxl.styles import Alignment, Border, Font, Side, numbers
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+
+thin_side = Side(style="thin")
+thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+upper_border = Border(top=thin_side)
+center = Alignment(horizontal="center")
+left = Alignment(horizontal="left")
+euro_format = '_("€"* #,##0.00_);_("€"* (#,##0.00);_("€"* "-"??_);_(@_)'
+
+STYLES = {
+    "border": {"border": thin_border},
+    "centered": {"border": thin_border, "alignment": center},
+    "serial": {"border": thin_border, "alignment": center, "font": Font(size=9),
+               "number_format": numbers.FORMAT_NUMBER},
+    "name": {"border": thin_border, "font": Font(size=10)},
+    "travel": {"border": thin_border, "alignment": center, "font": Font(size=8)},
+    "amount": {"border": thin_border, "alignment": center, "number_format": "#,##0.00"},
+    "percent": {"border": thin_border, "alignment": center, "number_format": "0.00%"},
+    "euro": {"border": thin_border, "number_format": euro_format},
+    "cambria": {"border": thin_border, "font": Font(name="Cambria", size=10)},
+    "label": {"alignment": left},
+    "signature": {"alignment": left, "font": Font(size=10)},
+    "signature_line": {"border": upper_border},
+    "signature_label": {"border": upper_border, "alignment": left},
+}
+
+# Position of each attribute in openpyxl's StyleArray and the style table it indexes.
+STYLE_FIELDS = {"font": (0, "_fonts"), "border": (2, "_borders"), "alignment": (5, "_alignments")}
+NUMBER_FORMAT_FIELD = 3
+
+
+def style_ids(wb, attributes: Dict) -> Tuple[Tuple[int, int], ...]:
+    """Adds the attributes of a style to the style table of the workbook.
+    Returns the StyleArray positions to overwrite along with their new ids."""
+
+    ids = []
+    for attribute, value in attributes.items():
+        if attribute == "number_format":
+            if value in BUILTIN_FORMATS_REVERSE:
+                idx = BUILTIN_FORMATS_REVERSE[value]
+            else:
+                idx = wb._number_formats.add(value) + BUILTIN_FORMATS_MAX_SIZE
+            ids.append((NUMBER_FORMAT_FIELD, idx))
+        else:
+            field, collection = STYLE_FIELDS[attribute]
+            ids.append((field, getattr(wb, collection).add(value)))
+    return tuple(ids)
+
+
+class WorkbookStyles:
+    """The shared styles registered in the style table of one workbook."""
+
+    def __init__(self, wb, styles: Dict[str, Dict] = STYLES):
+        self._ids = {name: style_ids(wb, attributes) for name, attributes in styles.items()}
+        self._arrays = {}
+
+    def style_array(self, current: Optional[StyleArray], name: str) -> StyleArray:
+        """Returns the style of a cell once the named style is applied to it."""
+
+        if current is None:
+            current = StyleArray()
+        key = (tuple(current), name)
+        array = self._arrays.get(key)
+        if array is None:
+            array = StyleArray(current)
+            for field, idx in self._ids[name]:
+                array[field] = idx
+            self._arrays[key] = array
+        return StyleArray(array)
+
+    def apply(self, ws, rows: Iterable[int], columns: Sequence[Optional[str]], min_col: int = 1):
+        """Applies columns[n] to the cell in column min_col + n of every row.
+        Columns without a style name are left untouched."""
+
+        for row in rows:
+            for column, name in enumerate(columns, min_col):
+                if name is not None:
+                    cell = ws.cell(row=row, column=column)
+                    cell._style = self.style_array(cell._style, name)
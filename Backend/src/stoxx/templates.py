@@ -0,0 +1,111 @@
+"""In-memory cache of the stoxx template workbooks.
+
+Each template is parsed once per process and kept as a pickled prototype from which every
+export gets its own workbook, while the per-employee sheets are cloned from a precompiled copy
+of the template sheet. A template is parsed again as soon as the mtime of its file changes."""
+
+import logging
+import os
+import pickle
+import threading
+from copy import copy
+from typing import Dict
+
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.worksheet.cell_range import MultiCellRange
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TEMPLATE = "data/Template_stoxx.xlsx"
+STOXX_SHEET_TEMPLATE = "data/Stoxx_sheet_template.xlsx"
+
+_cache: Dict[str, "TemplatePrototype"] = {}
+_lock = threading.Lock()
+
+
+class SheetPrototype:
+    """Precompiled cells, merged cells, dimensions and page settings of a template sheet."""
+
+    def __init__(self, ws):
+        self.cells = [
+            (cell.row, cell.column, cell._value, cell.data_type, tuple(cell._style))
+            for cell in ws._cells.values()
+        ]
+        self.merged_cells = [merged.coord for merged in ws.merged_cells.ranges]
+        self.row_dimensions = dict(ws.row_dimensions)
+        self.column_dimensions = dict(ws.column_dimensions)
+        self.sheet_format = ws.sheet_format
+        self.sheet_properties = ws.sheet_properties
+        self.page_margins = ws.page_margins
+        self.page_setup = ws.page_setup
+        self.print_options = ws.print_options
+
+    def clone(self, wb, title: str):
+        """Adds a copy of the sheet to the workbook, which must have been created from the same
+        template so that the style ids of the cells point to the same styles."""
+
+        ws = wb.create_sheet(title)
+        cells = ws._cells
+        for row, column, value, data_type, style in self.cells:
+            cell = Cell(ws, row=row, column=column)
+            cell._value = value
+            cell.data_type = data_type
+            cell._style = StyleArray(style)
+            cells[(row, column)] = cell
+
+        for key, dim in self.row_dimensions.items():
+            ws.row_dimensions[key] = copy(dim)
+            ws.row_dimensions[key].worksheet = ws
+        for key, dim in self.column_dimensions.items():
+            ws.column_dimensions[key] = copy(dim)
+            ws.column_dimensions[key].worksheet = ws
+        # plain ranges are all the writer needs; MergedCellRange would recompute the edge borders
+        ws.merged_cells = MultiCellRange(self.merged_cells)
+        ws.sheet_format = copy(self.sheet_format)
+        ws.sheet_properties = copy(self.sheet_properties)
+        ws.page_margins = copy(self.page_margins)
+        ws.page_setup = copy(self.page_setup)
+        ws.print_options = copy(self.print_options)
+        return ws
+
+
+class TemplatePrototype:
+    """Parsed template workbook along with the prototypes of its sheets."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        wb = openpyxl.load_workbook(path)
+        self.workbook = pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL)
+        self.sheets = {ws.title: SheetPrototype(ws) for ws in wb}
+
+    def new_workbook(self):
+        """Returns a fresh, independent copy of the template workbook."""
+
+        return pickle.loads(self.workbook)
+
+
+def get_template(path: str) -> TemplatePrototype:
+    """Returns the prototype of the template, parsing the file if it is not cached yet
+    or was modified since it was parsed."""
+
+    mtime = os.path.getmtime(path)
+    with _lock:
+        template = _cache.get(path)
+        if template is None or template.mtime != mtime:
+            logger.info("Loading stoxx template %s", path)
+            template = TemplatePrototype(path)
+            _cache[path] = template
+    return template
+
+
+def warm():
+    """Parses the stoxx templates ahead of the first export."""
+
+    for path in (SUMMARY_TEMPLATE, STOXX_SHEET_TEMPLATE):
+        try:
+            get_template(path)
+        except OSError as e:
+            logger.warning("Could not load stoxx template %s: %s", path, e)
@@ -0,0 +1,98 @@
+"""Benchmark of the leave rows ingestion on PostgreSQL for 10k, 100k and 1M rows.
+
+"orm" inserts the rows with bulk_insert_mappings, as done on other databases; "copy" streams
+them through a staging table with COPY FROM STDIN. Everything runs in a transaction that is
+rolled back, so the database is left untouched.
+Run from the Backend directory: python -m tests.benchmark.bench_leave_copy [--database-url URL]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.db import bulk_load
+from src.db.model import models
+from src.db.model.database import SQLALCHEMY_DATABASE_URL, Base
+
+EMPLOYEES = 1000
+STATUSES = ("Sick Leave", "Casual Leave", "Earned Leave")
+
+
+def seed_employees(db: Session) -> list:
+    """Adds the employees the leave rows refer to and returns their ids."""
+
+    employees = [
+        models.EmployeeData(indxx_id=f"BN{n}", hr_code=f"BN_{n:05d}", first_name="First", last_name=f"Last{n}")
+        for n in range(EMPLOYEES)
+    ]
+    db.add_all(employees)
+    db.flush()
+    return [employee.employee_id for employee in employees]
+
+
+def make_leaves(size: int, employee_ids: list) -> pd.DataFrame:
+    """Creates the cleaned dataframe of a leave upload with the given number of rows."""
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "employee_id": rng.choice(employee_ids, size),
+            "leave_status": rng.choice(STATUSES, size),
+            "leave_date": pd.Timestamp(2024, 5, 1) + pd.to_timedelta(rng.integers(0, 31, size), unit="D"),
+            "transaction_status": "AVAILED",
+        }
+    )
+
+
+def load_orm(db: Session, df: pd.DataFrame):
+    """Inserts the rows with the ORM bulk mappings."""
+
+    db.bulk_insert_mappings(models.LeaveSheetData, df.to_dict(orient="records"))
+
+
+def load_copy(db: Session, df: pd.DataFrame):
+    """Inserts the rows through a COPY staging table."""
+
+    bulk_load.copy_insert(db, models.LeaveSheetData, df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--skip-orm", action="store_true", help="only time the COPY load")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    print(f"{'rows':>10} {'orm (rows/s)':>14} {'copy (rows/s)':>14} {'speedup':>8}")
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            Base.metadata.create_all(connection)
+            db = Session(bind=connection, join_transaction_mode="create_savepoint")
+            employee_ids = seed_employees(db)
+            for size in args.sizes:
+                df = make_leaves(size, employee_ids)
+                rates = {}
+                for name, load in (("orm", load_orm), ("copy", load_copy)):
+                    if name == "orm" and args.skip_orm:
+                        continue
+                    savepoint = connection.begin_nested()
+                    start = time.perf_counter()
+                    load(db, df)
+                    db.flush()
+                    rates[name] = size / (time.perf_counter() - start)
+                    savepoint.rollback()
+                orm = rates.get("orm")
+                speedup = f"{rates['copy'] / orm:.1f}x" if orm else "-"
+                orm = f"{orm:,.0f}" if orm else "-"
+                print(f"{size:>10} {orm:>14} {rates['copy']:>14,.0f} {speedup:>8}")
+        finally:
+            transaction.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark of the stoxx workbook build for projects of 10, 100 and 500 employees.
+
+"before" replays the previous write pattern, where both workbooks were saved to disk after
+every employee; "after" is the in-memory build with a single save per workbook.
+Run from the Backend directory: python -m tests.benchmark.bench_stoxx_export
+"""
+import argparse
+import os
+import time
+from datetime import date
+from tempfile import TemporaryDirectory
+
+from src import service
+from src.stoxx.templates import SheetPrototype
+
+MONTH = 5
+YEAR = 2024
+
+
+def make_project(size: int, project_code: str = "BENCH") -> list:
+    """Creates the employees of a synthetic project with a filled timesheet for the month."""
+
+    user_list = []
+    for n in range(1, size + 1):
+        timesheet = []
+        for day in range(1, 32):
+            weekday = date(YEAR, MONTH, day).weekday()
+            status = "Saturday" if weekday == 5 else "Sunday" if weekday == 6 else ""
+            if not status and day % 9 == 0:
+                status = "Leave"
+            description = "" if status else f"Index calculation {day}"
+            timesheet.append({"day_of_month": day, "work_description": description, "status": status})
+        user_list.append(
+            {
+                "employee_id": n,
+                "indxx_id": f"IN{n}",
+                "hr_code": f"HR_{n:05d}",
+                "first_name": f"First{n}",
+                "last_name": f"Last{n}",
+                "start_date": date(2020, 1, 1),
+                "level": "LAG2",
+                "team": "SID",
+                "department": "Engineering",
+                "manager": "Manager",
+                "project_number": project_code,
+                "project_code": project_code,
+                "project_name": "Benchmark",
+                "timesheet": timesheet,
+            }
+        )
+    return user_list
+
+
+def build_before(user_list: list, tmpdir: str):
+    """Builds the workbooks while saving both of them after every employee."""
+
+    clone = SheetPrototype.clone
+    generate_stoxx_sheet = service.generate_stoxx_sheet
+    summary = {}
+
+    def tracking_clone(prototype, wb, title):
+        summary["wb"] = wb
+        return clone(prototype, wb, title)
+
+    def saving_generate(user, j, wsx, leave_days):
+        generate_stoxx_sheet(user, j, wsx, leave_days)
+        summary["wb"].save(os.path.join(tmpdir, "Template_stoxx_BENCH.xlsx"))
+        wsx.parent.save(os.path.join(tmpdir, "Stoxx_sheet_BENCH.xlsx"))
+
+    SheetPrototype.clone = tracking_clone
+    service.generate_stoxx_sheet = saving_generate
+    try:
+        return service.build_stoxx_workbooks("BENCH", user_list, MONTH, YEAR)
+    finally:
+        SheetPrototype.clone = clone
+        service.generate_stoxx_sheet = generate_stoxx_sheet
+
+
+def build_after(user_list: list, tmpdir: str):
+    """Builds the workbooks in memory."""
+
+    return service.build_stoxx_workbooks("BENCH", user_list, MONTH, YEAR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--skip-before", action="store_true", help="only time the in-memory build")
+    args = parser.parse_args()
+
+    print(f"{'employees':>10} {'before (s)':>12} {'after (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        user_list = make_project(size)
+        timings = {}
+        with TemporaryDirectory() as tmpdir:
+            for name, build in (("before", build_before), ("after", build_after)):
+                if name == "before" and args.skip_before:
+                    continue
+                start = time.perf_counter()
+                build(user_list, tmpdir)
+                timings[name] = time.perf_counter() - start
+        before = timings.get("before")
+        speedup = f"{before / timings['after']:.1f}x" if before else "-"
+        before = f"{before:.2f}" if before else "-"
+        print(f"{size:>10} {before:>12} {timings['after']:>12.2f} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Micro-benchmark of the stoxx sheet formatting, measured per 1,000 rows.
+
+The test only checks the formatting and that the styles are shared; to print the timing,
+run from the Backend directory: python -m tests.benchmark.test_stoxx_formatting
+"""
+import time
+
+from src import service
+from src.stoxx import templates
+from src.stoxx.styles import WorkbookStyles
+
+ROWS = 1000
+
+
+def style_table_size(wb) -> int:
+    return len(wb._fonts) + len(wb._borders) + len(wb._alignments) + len(wb._number_formats)
+
+
+def format_rows(rows: int):
+    """Formats the summary and stoxx sheet rows of as many employees.
+    Returns the seconds it took with the workbooks."""
+
+    wb = templates.get_template(templates.SUMMARY_TEMPLATE).new_workbook()
+    wbx = templates.get_template(templates.STOXX_SHEET_TEMPLATE).new_workbook()
+    start = time.perf_counter()
+    service.format_stoxx_timesheet(wb["Summary"], WorkbookStyles(wb), service.SUMMARY_FIRST_ROW, rows)
+    service.format_stoxx_sheet(wbx["stoxx_sheet"], WorkbookStyles(wbx), service.STOXX_SHEET_FIRST_ROW, rows)
+    return time.perf_counter() - start, wb, wbx
+
+
+def test_stoxx_formatting_throughput():
+    _, wb, wbx = format_rows(ROWS)
+
+    sh = wb["Summary"]
+    last = service.SUMMARY_FIRST_ROW + 2 * ROWS - 1
+    assert sh[f"A{last - 1}"].font.sz == 9
+    assert sh[f"H{last - 1}"].number_format == "0.00%"
+    assert sh[f"C{last}"].alignment.horizontal == "center"
+    assert sh[f"L{last}"].border.bottom.style == "thin"
+    assert wbx["stoxx_sheet"][f"I{service.STOXX_SHEET_FIRST_ROW + ROWS - 1}"].font.name == "Cambria"
+
+    # The styles are shared, so formatting more rows must not grow the style tables.
+    _, wb_twice, wbx_twice = format_rows(2 * ROWS)
+    assert style_table_size(wb_twice) == style_table_size(wb)
+    assert style_table_size(wbx_twice) == style_table_size(wbx)
+
+
+if __name__ == "__main__":
+    elapsed, _, _ = format_rows(ROWS)
+    print(f"stoxx formatting: {elapsed * 1000:.1f} ms per {ROWS:,} rows")
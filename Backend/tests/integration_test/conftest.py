@@ -9,6 +9,8 @@ from sqlalchemy.orm import sessionmaker
 from src.db.model.database import Base, get_db
 from src.db.model.models import *
 from src.main import app
+from src.db import read_cache
+from src.stoxx import cache
 from datetime import date
 
 DATABASE_URL = "sqlite:///./test_db.db"
@@ -39,6 +41,23 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+@pytest.fixture(autouse=True)
+def stoxx_cache_dir(tmp_path, monkeypatch):
+    """Keeps the stoxx workbook cache of every test in its own temporary directory."""
+
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path / "stoxx_cache"))
+    return cache.CACHE_DIR
+
+
+@pytest.fixture(autouse=True)
+def empty_read_cache():
+    """Starts every test with an empty read cache, as the fixtures write to the database directly."""
+
+    read_cache.clear()
+    yield
+    read_cache.clear()
+
+
 @pytest.fixture(scope="module")
 def test_app():
     """Sets up and tears down the test database and test client.
@@ -74,7 +93,7 @@ def test_session_local():
 def upload_single_employee_data(test_session_local):
     """
     Fixture to upload data for a single employee into the dummy_database.
-    This function creates and commits new records for level, department, manager, project number,
+    This function creates and commits new records for level, team, department, manager, project number,
     project code, project name, and an employee in the dummy_database. It ensures that all necessary
     foreign key relationships are properly established before adding the employee record.
 
@@ -88,49 +107,50 @@ def upload_single_employee_data(test_session_local):
             level_id=1,
             level="LAG2",
         )
-        db.add(new_level)
+        db.merge(new_level)
+        db.commit()
+
+        new_team = TeamData(
+            team_id=1,
+            team="SID",
+        )
+        db.merge(new_team)
         db.commit()
-        db.refresh(new_level)
 
         new_department = DepartmentData(
             department_id=1,
             department="Engineering",
         )
-        db.add(new_department)
+        db.merge(new_department)
         db.commit()
-        db.refresh(new_department)
 
         new_manager = ManagerData(
             manager_id=1,
             manager="Yogesh Mann",
         )
-        db.add(new_manager)
+        db.merge(new_manager)
         db.commit()
-        db.refresh(new_manager)
 
         new_project_number = ProjectNumberData(
             project_number_id=1,
             project_number="IN120",
         )
-        db.add(new_project_number)
+        db.merge(new_project_number)
         db.commit()
-        db.refresh(new_project_number)
 
         new_project_code = ProjectCodeData(
             project_code_id=1,
             project_code="IN120",
         )
-        db.add(new_project_code)
+        db.merge(new_project_code)
         db.commit()
-        db.refresh(new_project_code)
 
         new_project_name = ProjectNameData(
             project_name_id=1,
             project_name="SID",
         )
-        db.add(new_project_name)
+        db.merge(new_project_name)
         db.commit()
-        db.refresh(new_project_name)
 
         new_employee = EmployeeData(
             employee_id=1,
@@ -140,13 +160,14 @@ def upload_single_employee_data(test_session_local):
             last_name="Doe",
             start_date=date(2021, 1, 1),
             level_id=1,
+            team_id=1,
             manager_id=1,
             department_id=1,
             project_number_id=1,
             project_code_id=1,
             project_name_id=1,
         )
-        db.add(new_employee)
+        new_employee = db.merge(new_employee)
         db.commit()
         db.refresh(new_employee)
         return new_employee
\ No newline at end of file
@@ -1,4 +1,22 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from io import BytesIO
+from zipfile import ZipFile
+
+import openpyxl
+from openpyxl.cell.cell import MergedCell
+import pytest
+from sqlalchemy import text
+
 from src.db.model.models import *
+from src import service
+from src.db import writer_func as wt
+from src.db.schema import schemas
+from src.stoxx import jobs, pool, templates
 
 
 def test_read_user(upload_single_employee_data, test_app):
@@ -33,3 +51,731 @@ def test_read_user(upload_single_employee_data, test_app):
     assert data["project_code_id"] == upload_single_employee_data.project_code_id
     assert data["project_name_id"] == upload_single_employee_data.project_name_id
 
+
+
+def add_may_2024_timesheet(db, employee_id: int):
+    """Fills the timesheet of May 2024 of the employee, with Saturdays as the only days off."""
+
+    with db:
+        db.query(TimeSheetData).delete()
+        for day in range(1, 32):
+            status = "Saturday" if date(2024, 5, day).weekday() == 5 else ""
+            db.add(TimeSheetData(employee_id=employee_id, day_of_month=day, month=5, year=2024,
+                                 work_description="Index review", status=status))
+        db.commit()
+
+
+def test_get_stoxx_sheet(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'get_stoxx_sheet' for a project code whose only employee has
+    filled the timesheet of the month.
+
+    Asserts:
+        The status code of the API response is 200.
+        The zip holds the summary workbook and the stoxx sheet of the project code.
+        The employee's sheet carries the description and the working days of the month.
+    """
+
+    add_may_2024_timesheet(test_session_local, upload_single_employee_data.employee_id)
+    payload = {"project_code": ["IN120"], "month": 5, "year": 2024}
+    response = test_app.post("/get_stoxx_sheet", json=payload)
+    assert response.status_code == 200
+    assert json.loads(response.headers["X-Status-List"]) == [{"details": "Generated successfully"}]
+
+    with ZipFile(BytesIO(response.content)) as zf:
+        assert sorted(zf.namelist()) == ["IN120/Stoxx_sheet_IN120.xlsx", "IN120/Template_stoxx_IN120.xlsx"]
+        wb = openpyxl.load_workbook(BytesIO(zf.read("IN120/Template_stoxx_IN120.xlsx")))
+
+    assert wb.sheetnames == ["Summary", upload_single_employee_data.hr_code]
+    ws = wb[upload_single_employee_data.hr_code]
+    assert ws["C6"].value == "John Doe"
+    assert ws["L4"].value == "Index review"
+    assert ws["G48"].value == 26
+
+
+def test_get_stoxx_sheet_stream(upload_single_employee_data, test_session_local, test_app):
+    """Test the streaming mode of the API endpoint 'get_stoxx_sheet'.
+
+    Asserts:
+        The status code of the API response is 200.
+        The zip holds the workbooks of the project code followed by manifest.json with the status list.
+    """
+
+    add_may_2024_timesheet(test_session_local, upload_single_employee_data.employee_id)
+
+    payload = {"project_code": ["IN120"], "month": 5, "year": 2024}
+    response = test_app.post("/get_stoxx_sheet?stream=true", json=payload)
+    assert response.status_code == 200
+    assert "X-Status-List" not in response.headers
+
+    with ZipFile(BytesIO(response.content)) as zf:
+        assert zf.namelist() == [
+            "IN120/Template_stoxx_IN120.xlsx",
+            "IN120/Stoxx_sheet_IN120.xlsx",
+            "manifest.json",
+        ]
+        assert json.loads(zf.read("manifest.json")) == [{"details": "Generated successfully"}]
+
+
+def test_stoxx_job(upload_single_employee_data, test_session_local, test_app, tmp_path, monkeypatch):
+    """Test the stoxx job API endpoints: submit a job, poll its status and download the zip.
+
+    Asserts:
+        The job is accepted with status code 202 and tracks the requested project code.
+        The job completes and reports the project code as completed.
+        The downloaded zip holds the workbooks of the project code.
+    """
+
+    monkeypatch.setattr(jobs, "JOB_DIR", str(tmp_path))
+    add_may_2024_timesheet(test_session_local, upload_single_employee_data.employee_id)
+
+    payload = {"project_code": ["IN120"], "month": 5, "year": 2024}
+    response = test_app.post("/stoxx_jobs", json=payload)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    for _ in range(100):
+        job = test_app.get(f"/stoxx_jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "completed"
+    assert job["projects"] == {"IN120": "completed"}
+    assert job["status_list"] == [{"details": "Generated successfully"}]
+
+    response = test_app.get(f"/stoxx_jobs/{job_id}/download")
+    assert response.status_code == 200
+    with ZipFile(BytesIO(response.content)) as zf:
+        assert sorted(zf.namelist()) == ["IN120/Stoxx_sheet_IN120.xlsx", "IN120/Template_stoxx_IN120.xlsx"]
+
+    assert test_app.get("/stoxx_jobs/unknown").status_code == 404
+
+
+def test_stoxx_job_interrupted(tmp_path, monkeypatch):
+    """Test the states of the stoxx jobs whose process stopped building them.
+
+    Asserts:
+        A job left running by a previous process with the same pid is reported as failed.
+        The jobs still queued when the job pool shuts down are recorded as failed.
+    """
+
+    monkeypatch.setattr(jobs, "JOB_DIR", str(tmp_path))
+    jobs.write_state({"job_id": "left", "status": "running", "owner": "previous", "pid": os.getpid()})
+    job = jobs.get_job("left")
+    assert (job["status"], job["error"]) == ("failed", "Interrupted by a server restart")
+
+    release = threading.Event()
+    monkeypatch.setattr(jobs, "load_stoxx_data", lambda *args: ({}, {}))
+    monkeypatch.setattr(jobs, "run_job", lambda *args: release.wait(5))
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 1)
+    monkeypatch.setattr(jobs, "_executor", None)
+    project_code_data = schemas.StoxxSheet(project_code=["IN120"], month=5, year=2024)
+    running = jobs.submit_job(project_code_data, None)
+    queued = jobs.submit_job(project_code_data, None)
+
+    jobs.shutdown()
+    assert jobs.get_job(queued["job_id"])["status"] == "failed"
+    assert jobs.get_job(running["job_id"])["status"] == "queued"
+    release.set()
+
+
+def test_stoxx_pool_recovers_from_broken_pool(monkeypatch):
+    """Test the shared stoxx worker pool used from several threads and after a worker died.
+
+    Asserts:
+        Threads asking for the pool at the same time get the same pool.
+        A dying worker raises BrokenProcessPool and the next projects are built by a new pool.
+    """
+
+    monkeypatch.setattr(pool, "STOXX_MAX_WORKERS", 2)
+    monkeypatch.setattr(pool, "_executor", None)
+    executors = []
+    threads = [threading.Thread(target=lambda: executors.append(pool.get_executor())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(executor) for executor in executors}) == 1
+
+    try:
+        with pytest.raises(BrokenProcessPool):
+            list(pool.map_projects(os._exit, [(1,), (1,)]))
+        assert pool._executor is None
+        assert list(pool.map_projects(abs, [(-1,), (-2,)])) == [1, 2]
+    finally:
+        pool.shutdown()
+
+
+def test_stoxx_template_clone():
+    """Test the cloning of the employee sheet from the precompiled template sheet.
+
+    Asserts:
+        The cloned sheet has the same cell values, styles, merged cells and dimensions
+        as the copy made by openpyxl's copy_worksheet.
+    """
+
+    template = templates.get_template(templates.SUMMARY_TEMPLATE)
+    wb = template.new_workbook()
+    copied = wb.copy_worksheet(wb["stoxx_sheet_template"])
+    cloned = template.sheets["stoxx_sheet_template"].clone(wb, "HR_001")
+
+    def cells(ws):
+        # the clone keeps plain merged ranges, so only the cells of copy_worksheet are compared
+        return {
+            cell.coordinate: (cell.value, cell.data_type, tuple(cell._style) if cell.has_style else None)
+            for cell in ws._cells.values()
+            if not isinstance(cell, MergedCell)
+        }
+
+    assert cells(cloned) == cells(copied)
+    assert {str(merged) for merged in cloned.merged_cells.ranges} == {
+        str(merged) for merged in copied.merged_cells.ranges
+    }
+    assert {key: dim.height for key, dim in cloned.row_dimensions.items()} == {
+        key: dim.height for key, dim in copied.row_dimensions.items()
+    }
+    assert {key: dim.width for key, dim in cloned.column_dimensions.items()} == {
+        key: dim.width for key, dim in copied.column_dimensions.items()
+    }
+    assert cloned.sheet_format.defaultRowHeight == copied.sheet_format.defaultRowHeight
+
+
+def test_stoxx_template_reload(tmp_path):
+    """Test the template cache against changes of the template file.
+
+    Asserts:
+        The template is parsed once while its file is unchanged.
+        The template is parsed again once the mtime of its file changes.
+    """
+
+    path = str(tmp_path / "Template_stoxx.xlsx")
+    wb = openpyxl.load_workbook(templates.SUMMARY_TEMPLATE)
+    wb.save(path)
+
+    template = templates.get_template(path)
+    assert templates.get_template(path) is template
+
+    wb["Summary"]["A1"] = "Reloaded"
+    wb.save(path)
+    os.utime(path, (template.mtime + 10, template.mtime + 10))
+    reloaded = templates.get_template(path)
+    assert reloaded is not template
+    assert reloaded.mtime == template.mtime + 10
+    assert reloaded.new_workbook()["Summary"]["A1"].value == "Reloaded"
+    assert templates.get_template(path) is reloaded
+
+
+def test_get_stoxx_roster(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'get_stoxx_roster' for the whole company.
+
+    Asserts:
+        The status code of the API response is 200.
+        The roster keeps the headers of the template and lists the employee below them.
+    """
+
+    add_may_2024_timesheet(test_session_local, upload_single_employee_data.employee_id)
+
+    response = test_app.get("/stoxx_roster", params={"month": 5, "year": 2024})
+    assert response.status_code == 200
+
+    ws = openpyxl.load_workbook(BytesIO(response.content))["stoxx_sheet"]
+    assert ws["A4"].value == "S. No."
+    row = [cell.value for cell in ws[5]]
+    assert row[:6] == [1, "John", "Doe", "John Doe", upload_single_employee_data.hr_code, "SID"]
+    assert row[6].date() == upload_single_employee_data.start_date
+    assert row[8] == "IN120"
+    assert row[10] == "-"
+    assert ws.max_row == 5
+
+
+def test_get_stoxx_sheet_cache(upload_single_employee_data, test_session_local, test_app, monkeypatch):
+    """Test that 'get_stoxx_sheet' reuses the workbooks of a project until its data changes.
+
+    Asserts:
+        The workbooks are built on the first call only, as long as the data is unchanged.
+        A change to the timesheet of the project rebuilds its workbooks.
+    """
+
+    add_may_2024_timesheet(test_session_local, upload_single_employee_data.employee_id)
+    builds = []
+    build_stoxx_workbooks = service.build_stoxx_workbooks
+
+    def counting_build(*args):
+        builds.append(args[0])
+        return build_stoxx_workbooks(*args)
+
+    monkeypatch.setattr(service, "build_stoxx_workbooks", counting_build)
+    payload = {"project_code": ["IN120"], "month": 5, "year": 2024}
+    first = test_app.post("/get_stoxx_sheet", json=payload)
+    second = test_app.post("/get_stoxx_sheet", json=payload)
+    assert first.status_code == second.status_code == 200
+    assert builds == ["IN120"]
+    with ZipFile(BytesIO(first.content)) as zf1, ZipFile(BytesIO(second.content)) as zf2:
+        for name in zf1.namelist():
+            assert zf1.read(name) == zf2.read(name)
+
+    with test_session_local as db:
+        db.query(TimeSheetData).filter_by(day_of_month=2).update({"work_description": "Rebalancing"})
+        db.commit()
+    assert test_app.post("/get_stoxx_sheet", json=payload).status_code == 200
+    assert builds == ["IN120", "IN120"]
+
+
+def test_add_employee_data(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'add_employee_data' with a csv updating an employee and adding another one.
+
+    Asserts:
+        The status code of the API response is 200.
+        Existing lookup values are reused and the new ones are created once.
+        The counts of inserted, updated and unchanged employees, with nothing rewritten on a second upload.
+    """
+
+    csv = (
+        "indxx_id,hr_code,first_name,last_name,department,level,team,manager,project_number,project_code,project_name\n"
+        "IN345,HR_001,John,Doe,Engineering,LAG3,SID,Yogesh Mann,IN120,IN120,SID\n"
+        "IN999,HR_999,Jane,Roe,Engineering,LAG3,SID,Yogesh Mann,IN120,IN200,SID\n"
+    )
+    response = test_app.post("/add_employee_data", files={"file": ("employees.csv", csv)})
+    assert response.status_code == 200
+    assert (response.json()["inserted"], response.json()["updated"], response.json()["unchanged"]) == (1, 1, 0)
+
+    response = test_app.post("/add_employee_data", files={"file": ("employees.csv", csv)})
+    assert (response.json()["inserted"], response.json()["updated"], response.json()["unchanged"]) == (0, 0, 2)
+
+    with test_session_local as db:
+        john = db.query(EmployeeData).filter_by(indxx_id="IN345").one()
+        jane = db.query(EmployeeData).filter_by(indxx_id="IN999").one()
+        assert db.query(LevelData).filter_by(level="LAG3").count() == 1
+        assert john.level.level == jane.level.level == "LAG3"
+        assert (john.team_id, john.manager_id, john.department_id) == (1, 1, 1)
+        assert (jane.team_id, jane.project_number_id, jane.project_name_id) == (1, 1, 1)
+        assert jane.project_code.project_code == "IN200"
+        db.delete(jane)
+        db.commit()
+
+
+def test_add_employee_data_in_chunks(upload_single_employee_data, test_session_local, test_app, monkeypatch):
+    """Test the API endpoint 'add_employee_data' with a csv read in chunks smaller than the file.
+
+    Asserts:
+        The status code of the API response is 200.
+        The counts cover the employees of every chunk, an employee repeated in another chunk counted once,
+        and all of them are stored with the values of their last row.
+        A file with a failing chunk leaves none of its employees written.
+    """
+
+    monkeypatch.setattr(wt, "UPLOAD_CHUNK_ROWS", 2)
+    header = "indxx_id,hr_code,first_name,last_name,department,level,team,manager,project_number,project_code,project_name\n"
+    row = "IN90{n},HR_90{n},{first_name},Roe{n},Engineering,LAG2,SID,Yogesh Mann,IN120,IN120,SID\n"
+    csv = header + "".join(row.format(n=n, first_name="Jane") for n in range(5))
+    csv += row.format(n=0, first_name="Janet")
+    response = test_app.post("/add_employee_data", files={"file": ("employees.csv", csv)})
+    assert response.status_code == 200
+    assert (response.json()["inserted"], response.json()["updated"], response.json()["unchanged"]) == (5, 0, 0)
+
+    failing = header + row.format(n=7, first_name="Jane") + row.format(n=8, first_name="Jane") + row.format(n=9, first_name="")
+    response = test_app.post("/add_employee_data", files={"file": ("employees.csv", failing)})
+    assert response.status_code == 406
+
+    with test_session_local as db:
+        employees = db.query(EmployeeData).filter(EmployeeData.indxx_id.like("IN90%")).all()
+        assert sorted(employee.last_name for employee in employees) == [f"Roe{n}" for n in range(5)]
+        assert db.query(EmployeeData).filter_by(indxx_id="IN900").one().first_name == "Janet"
+        for employee in employees:
+            db.delete(employee)
+        db.commit()
+
+
+def test_upload_leavesheet(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'upload_leavesheet' with a leave file uploaded twice, the second one
+    cancelling one of the leaves of the first one.
+
+    Asserts:
+        The status code of the API response is 200.
+        The leave days are stored and marked on the timesheet.
+        The cancelled leave is deleted and its timesheet day cleared.
+    """
+
+    today = date.today()
+    header = (
+        "Indxx Capital Management Pvt. Ltd.,,,\n\"Plot No. 390,\nGurugram\",,,\nTeam on Leave,,,\n"
+        "Employee No,Name of the Employee,Leave/Holiday,From Date,To Date,Number of Days,"
+        "Transaction Status,Remarks,Applied On,Contact Details\n"
+    )
+    month = today.strftime("%b-%y")
+    first = f"IN345,John Doe,Sick Leave,02-{month},03-{month},2,AVAILED,,01-{month},\n"
+    second = f"IN345,John Doe,Sick Leave,02-{month},02-{month},1,AVAILED,,01-{month},\n"
+
+    with test_session_local as db:
+        db.add_all(
+            TimeSheetData(employee_id=1, day_of_month=day, month=today.month, year=today.year,
+                          work_description="", status="")
+            for day in (1, 2, 3)
+        )
+        db.commit()
+
+    response = test_app.post("/upload_leavesheet", files={"file": ("leaves.csv", header + first)})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 1
+
+    def leave_state():
+        with test_session_local as db:
+            db.expire_all()
+            leave_days = sorted(leave.leave_date.day for leave in db.query(LeaveSheetData).filter_by(employee_id=1))
+            statuses = {
+                entry.day_of_month: entry.status
+                for entry in db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year)
+            }
+            return leave_days, statuses
+
+    assert leave_state() == ([2, 3], {1: "", 2: "Leave", 3: "Leave"})
+
+    response = test_app.post("/upload_leavesheet", files={"file": ("leaves.csv", header + second)})
+    assert response.status_code == 200
+    assert leave_state() == ([2], {1: "", 2: "Leave", 3: ""})
+
+    with test_session_local as db:
+        db.query(LeaveSheetData).filter_by(employee_id=1).delete()
+        db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year).delete()
+        db.commit()
+
+
+def test_upload_holidaysheet(upload_single_employee_data, test_session_local, test_app, monkeypatch):
+    """Test the API endpoint 'upload_holidaysheet' with a holiday file uploaded twice, the second one
+    moving the holiday to another day, then with the holiday spanning two days read in separate chunks.
+
+    Asserts:
+        The status code of the API response is 200.
+        The holiday is stored and marked on the timesheet.
+        The moved holiday keeps its record and its previous timesheet day is cleared.
+        Every day of a holiday is kept whatever the chunk it is read in.
+    """
+
+    today = date.today()
+    day = lambda d: date(today.year, today.month, d).strftime("%d-%m-%Y")
+
+    with test_session_local as db:
+        db.add_all(
+            TimeSheetData(employee_id=1, day_of_month=d, month=today.month, year=today.year,
+                          work_description="Work", status="Present")
+            for d in (1, 2, 3)
+        )
+        db.commit()
+
+    def holiday_state():
+        with test_session_local as db:
+            db.expire_all()
+            holidays = [(holiday.holiday, holiday.holiday_date.day) for holiday in db.query(HolidayData)]
+            statuses = {
+                entry.day_of_month: entry.status
+                for entry in db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year)
+            }
+            return holidays, statuses
+
+    response = test_app.post("/upload_holidaysheet", files={"file": ("holidays.csv", f"holiday_date,holiday\n{day(2)},Diwali\n")})
+    assert response.status_code == 200
+    assert holiday_state() == ([("Diwali", 2)], {1: "Present", 2: "Holiday", 3: "Present"})
+
+    response = test_app.post("/upload_holidaysheet", files={"file": ("holidays.csv", f"holiday_date,holiday\n{day(3)},Diwali\n")})
+    assert response.status_code == 200
+    assert holiday_state() == ([("Diwali", 3)], {1: "Present", 2: "", 3: "Holiday"})
+
+    monkeypatch.setattr(wt, "UPLOAD_CHUNK_ROWS", 1)
+    csv = f"holiday_date,holiday\n{day(2)},Diwali\n{day(3)},Diwali\n"
+    response = test_app.post("/upload_holidaysheet", files={"file": ("holidays.csv", csv)})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 2
+    holidays, statuses = holiday_state()
+    assert (sorted(holidays), statuses) == ([("Diwali", 2), ("Diwali", 3)], {1: "Present", 2: "Holiday", 3: "Holiday"})
+
+    with test_session_local as db:
+        db.query(HolidayData).delete()
+        db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year).delete()
+        db.commit()
+
+
+def test_update_comp_off_data_batch(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'update_comp_off_data_batch' with comp offs of several date ranges
+    sent at once, then partly changed by a second batch.
+
+    Asserts:
+        The status code of the API response is 200.
+        The new comp offs are marked on the timesheet whether they are availed or not.
+        The changed comp offs are updated in place and their timesheet days updated accordingly.
+        An unknown Indxx ID fails the whole batch with a status code 400.
+    """
+
+    today = date.today()
+    day = lambda d: date(today.year, today.month, d).isoformat()
+    comp_off = lambda first, last, status: {
+        "indxx_id": "IN345", "from_date": day(first), "to_date": day(last), "transaction_status": status,
+    }
+
+    with test_session_local as db:
+        db.add_all(
+            TimeSheetData(employee_id=1, day_of_month=d, month=today.month, year=today.year,
+                          work_description="", status="")
+            for d in (1, 2, 3)
+        )
+        db.commit()
+
+    def comp_off_state():
+        with test_session_local as db:
+            db.expire_all()
+            comp_offs = sorted(
+                (leave.leave_date.day, leave.transaction_status)
+                for leave in db.query(LeaveSheetData).filter_by(employee_id=1, leave_status="Comp Off")
+            )
+            statuses = {
+                entry.day_of_month: entry.status
+                for entry in db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year)
+            }
+            return comp_offs, statuses
+
+    response = test_app.post(
+        "/update_comp_off_data_batch",
+        json={"comp_offs": [comp_off(1, 2, "AVAILED"), comp_off(3, 3, "NOT AVAILED")]},
+    )
+    assert response.status_code == 200
+    assert response.json()["changed_days"] == 3
+    assert comp_off_state() == (
+        [(1, "AVAILED"), (2, "AVAILED"), (3, "NOT AVAILED")],
+        {1: "Leave", 2: "Leave", 3: "Leave"},
+    )
+
+    response = test_app.post(
+        "/update_comp_off_data_batch",
+        json={"comp_offs": [comp_off(1, 3, "AVAILED"), comp_off(2, 2, "NOT AVAILED")]},
+    )
+    assert response.status_code == 200
+    assert response.json()["changed_days"] == 2
+    assert comp_off_state() == (
+        [(1, "AVAILED"), (2, "NOT AVAILED"), (3, "AVAILED")],
+        {1: "Leave", 2: "", 3: "Leave"},
+    )
+
+    response = test_app.post(
+        "/update_comp_off_data_batch",
+        json={"comp_offs": [comp_off(1, 1, "NOT AVAILED"), {**comp_off(1, 1, "AVAILED"), "indxx_id": "IN999"}]},
+    )
+    assert response.status_code == 400
+    assert "IN999" in response.json()["detail"]
+    assert comp_off_state()[0][0] == (1, "AVAILED")
+
+    with test_session_local as db:
+        db.query(LeaveSheetData).filter_by(employee_id=1).delete()
+        db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year).delete()
+        db.commit()
+
+
+def test_timesheet_status(test_session_local, test_app):
+    """Test the API endpoint 'timesheet_status' with an employee of the project who completed the
+    timesheet of the month, one who left a day blank and one who did not start it.
+    The status is read from the timesheet summaries maintained by 'add_timesheet'.
+
+    Asserts:
+        The status code of the API response is 200.
+        Every employee of the project is listed under the status of their timesheet, with their name.
+    """
+
+    today = date.today()
+    with test_session_local as db:
+        project = ProjectNameData(project_name="Status Report")
+        db.add(project)
+        db.flush()
+        employees = [
+            EmployeeData(indxx_id=f"ST{n}", hr_code=f"ST_{n}", first_name="Jane", last_name=last_name,
+                         project_name_id=project.project_name_id)
+            for n, last_name in enumerate(("Complete", "Progress", None))
+        ]
+        db.add_all(employees)
+        db.commit()
+        employee_ids = [employee.employee_id for employee in employees]
+
+    payload = [
+        {"day_of_month": d, "work_description": "" if (indxx_id, d) == ("ST1", 2) else "Work", "status": "",
+         "IN": "", "OUT": "", "indxx_id": indxx_id}
+        for indxx_id in ("ST0", "ST1")
+        for d in (1, 2)
+    ]
+    assert test_app.post("/add_timesheet", json=payload).status_code == 200
+
+    response = test_app.post("/timesheet_status", json={"project_names_list": ["Status Report"]})
+    assert response.status_code == 200
+    assert response.json() == {
+        "incomplete_data": {"indxx_id": ["ST1"], "name": ["Jane Progress"]},
+        "not_started_data": {"indxx_id": ["ST2"], "name": ["Jane"]},
+        "complete_data": {"indxx_id": ["ST0"], "name": ["Jane Complete"]},
+    }
+
+    with test_session_local as db:
+        db.query(TimeSheetData).filter(TimeSheetData.employee_id.in_(employee_ids)).delete()
+        db.query(TimesheetSummaryData).filter(TimesheetSummaryData.employee_id.in_(employee_ids)).delete()
+        db.query(EmployeeData).filter(EmployeeData.employee_id.in_(employee_ids)).delete()
+        db.query(ProjectNameData).filter_by(project_name="Status Report").delete()
+        db.commit()
+
+
+def test_timesheet_summary(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'timesheet_summary' while the timesheet of the month is changed by
+    the timesheet, holiday and comp off writers.
+
+    Asserts:
+        The status code of the API response is 200.
+        The summary counts the filled, blank, leave and holiday days of the month after every change,
+        weekends being counted in none of them.
+    """
+
+    today = date.today()
+    payload = [
+        {"day_of_month": 1, "work_description": "Work", "status": "", "IN": "", "OUT": "", "indxx_id": "IN345"},
+        {"day_of_month": 2, "work_description": "", "status": "", "IN": "", "OUT": "", "indxx_id": "IN345"},
+        {"day_of_month": 3, "work_description": "", "status": "Saturday", "IN": "", "OUT": "", "indxx_id": "IN345"},
+        {"day_of_month": 4, "work_description": "", "status": "", "IN": "", "OUT": "", "indxx_id": "IN345"},
+    ]
+
+    def summary():
+        response = test_app.get(f"/timesheet_summary/{today.year}/{today.month}")
+        assert response.status_code == 200
+        rows = [row for row in response.json() if row["indxx_id"] == "IN345"]
+        assert len(rows) == 1
+        return tuple(rows[0][column] for column in ("filled_days", "blank_days", "leave_days", "holiday_days"))
+
+    assert test_app.post("/add_timesheet", json=payload).status_code == 200
+    assert summary() == (1, 2, 0, 0)
+
+    holiday = date(today.year, today.month, 4).strftime("%d-%m-%Y")
+    response = test_app.post("/upload_holidaysheet", files={"file": ("holidays.csv", f"holiday_date,holiday\n{holiday},Diwali\n")})
+    assert response.status_code == 200
+    assert summary() == (1, 1, 0, 1)
+
+    comp_off = {"indxx_id": "IN345", "from_date": date(today.year, today.month, 2).isoformat(),
+                "to_date": date(today.year, today.month, 2).isoformat(), "transaction_status": "AVAILED"}
+    response = test_app.post("/update_comp_off_data_batch", json={"comp_offs": [comp_off]})
+    assert response.status_code == 200
+    assert summary() == (1, 0, 1, 1)
+
+    with test_session_local as db:
+        db.query(LeaveSheetData).filter_by(employee_id=1).delete()
+        db.query(HolidayData).delete()
+        db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year).delete()
+        db.query(TimesheetSummaryData).filter_by(employee_id=1).delete()
+        db.commit()
+
+
+def test_reference_data_cache(upload_single_employee_data, test_session_local, test_app):
+    """Test the cached endpoints 'project_codes', 'users' and 'get_time_window_status' with
+    conditional requests around the writers changing their data.
+
+    Asserts:
+        The responses carry an ETag and a request with a matching If-None-Match gets a 304 with no body.
+        An unknown Indxx ID gets a 404.
+        The employee upload, the role allocation and the window update invalidate the cached data.
+    """
+
+    def fetch(url, etag=None):
+        return test_app.get(url, headers={"If-None-Match": etag} if etag else {})
+
+    codes = fetch("/project_codes")
+    assert codes.status_code == 200
+    assert fetch("/project_codes", codes.headers["ETag"]).status_code == 304
+    assert fetch("/project_codes", codes.headers["ETag"]).content == b""
+
+    csv = (
+        "indxx_id,hr_code,first_name,last_name,department,level,team,manager,project_number,project_code,project_name\n"
+        "IN778,HR_778,Jane,Roe,Engineering,LAG2,SID,Yogesh Mann,IN120,IN777,SID\n"
+    )
+    assert test_app.post("/add_employee_data", files={"file": ("employees.csv", csv)}).status_code == 200
+    response = fetch("/project_codes", codes.headers["ETag"])
+    assert response.status_code == 200
+    assert "IN777" in response.json()
+    assert response.headers["ETag"] != codes.headers["ETag"]
+
+    user = fetch("/users/IN345")
+    assert user.json()["role"] is None
+    assert fetch("/users/IN345", user.headers["ETag"]).status_code == 304
+    assert fetch("/users/IN000").status_code == 404
+    role = {"indxx_id": "IN345", "is_super_user": False, "is_admin": True}
+    assert test_app.post("/create_role", json=role).status_code == 200
+    response = fetch("/users/IN345", user.headers["ETag"])
+    assert response.status_code == 200
+    assert response.json()["role"]["is_admin"] is True
+
+    window = fetch("/get_time_window_status")
+    assert window.json() == {"status": "Unfreeze"}
+    assert fetch("/get_time_window_status", window.headers["ETag"]).status_code == 304
+    freeze = {"freeze": True, "unfreeze": False, "super_user_id": "IN345"}
+    assert test_app.post("/update_time_window_status", json=freeze).status_code == 200
+    response = fetch("/get_time_window_status", window.headers["ETag"])
+    assert response.status_code == 200
+    assert response.json() == {"status": "Freeze"}
+
+    with test_session_local as db:
+        db.query(TimeWindowData).delete()
+        db.query(RoleData).filter_by(employee_id=1).delete()
+        db.query(EmployeeData).filter_by(indxx_id="IN778").delete()
+        db.query(ProjectCodeData).filter_by(project_code="IN777").delete()
+        db.commit()
+
+
+def test_hot_queries_use_indexes(test_session_local, test_app):
+    """Test that the hot lookups of the timesheet, leavesheet and holiday tables are planned on their indexes.
+
+    Asserts:
+        The query plan of every lookup searches the expected index instead of scanning the table.
+    """
+
+    lookups = {
+        # SQLite names the index of the unique constraint itself.
+        "(employee_id=? AND year=? AND month=?)": lambda db: db.query(TimeSheetData).filter_by(
+            employee_id=1, month=5, year=2024
+        ),
+        "INDEX ix_timesheet_data_year_month_day": lambda db: db.query(TimeSheetData).filter_by(
+            year=2024, month=5, day_of_month=1
+        ),
+        "INDEX ix_leavesheet_data_employee_date_status": lambda db: db.query(LeaveSheetData).filter_by(
+            employee_id=1, leave_date=date(2024, 5, 1), leave_status="Comp Off"
+        ),
+        "INDEX ix_leavesheet_data_leave_date": lambda db: db.query(LeaveSheetData).filter(
+            LeaveSheetData.leave_date >= date(2024, 5, 1), LeaveSheetData.leave_date <= date(2024, 5, 31)
+        ),
+        "INDEX ix_holiday_data_holiday_date": lambda db: db.query(HolidayData).filter(
+            HolidayData.holiday_date >= date(2024, 5, 1), HolidayData.holiday_date <= date(2024, 5, 31)
+        ),
+    }
+
+    with test_session_local as db:
+        for expected, lookup in lookups.items():
+            statement = lookup(db).statement.compile(
+                dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+            )
+            plan = " ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {statement}")))
+            assert plan.startswith("SEARCH") and expected in plan, plan
+
+
+def test_add_timesheet(upload_single_employee_data, test_session_local, test_app):
+    """Test the API endpoint 'add_timesheet' with a month saved twice, the second time with one day changed.
+
+    Asserts:
+        The status code of the API response is 200.
+        Every day is stored once and the number of changed days is returned.
+    """
+
+    today = date.today()
+    payload = [
+        {"day_of_month": day, "work_description": f"Task {day}", "status": "", "IN": "", "OUT": "", "indxx_id": "IN345"}
+        for day in range(1, 29)
+    ]
+    response = test_app.post("/add_timesheet", json=payload)
+    assert response.status_code == 200
+    assert response.json()["changed_days"] == 28
+
+    payload[4]["work_description"] = "Review"
+    response = test_app.post("/add_timesheet", json=payload)
+    assert response.json()["changed_days"] == 1
+
+    with test_session_local as db:
+        entries = db.query(TimeSheetData).filter_by(employee_id=1, month=today.month, year=today.year)
+        assert entries.count() == 28
+        assert entries.filter_by(day_of_month=5).one().work_description == "Review"
+        entries.delete()
+        db.commit()
@@ -0,0 +1,32 @@
+import os
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect
+
+from src.db.model.database import Base
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+
+def test_migrations_match_models(tmp_path):
+    """Test the migrations on an empty database.
+
+    Asserts:
+        Upgrading to the latest revision creates the schema declared by the models.
+        Downgrading to the base revision removes every table.
+    """
+
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url)
+    engine = create_engine(url)
+
+    command.upgrade(config, "head")
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+    command.downgrade(config, "base")
+    assert inspect(engine).get_table_names() == ["alembic_version"]
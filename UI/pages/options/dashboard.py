@@ -29,9 +29,6 @@ def show_dashboard(user_profile):
         orientation="horizontal",
     )
 
-    project_code_options = project_code_list()
-    project_name_options = project_name_list()
-
     if not st.session_state.get("prev_tab"):
         st.session_state["prev_tab"]=choice
     if st.session_state.get("prev_tab")!=choice:
@@ -41,7 +38,7 @@ def show_dashboard(user_profile):
                 del st.session_state[i]
 
     if choice == "Timesheet Status":
-        timesheet_status(user_profile['indxx_id'],project_name_options)
+        timesheet_status(user_profile['indxx_id'],project_name_list())
 
     elif choice == "Upload Data":
         upload_data_section()
@@ -50,7 +47,7 @@ def show_dashboard(user_profile):
         fill_timesheet()
 
     elif choice == "Stoxx Sheet":
-        download_stoxx_sheet(project_code_options)
+        download_stoxx_sheet(project_code_list())
 
     elif choice == "Role Allocation":
         role_allocation()
\ No newline at end of file
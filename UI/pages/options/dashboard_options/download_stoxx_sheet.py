@@ -1,6 +1,4 @@
 """Download Stoxx Sheet function"""
-import base64
-import json
 from datetime import date
 from typing import List
 
@@ -99,25 +97,62 @@ def download_stoxx_sheet(options: List[str]):
 
     if st.button("Download Stoxx Sheet"):
         data = {"project_code": selected_options, "month": month, "year": year}
-        with st.spinner("Fetching stoxx sheets, Avoid clicking anywhere else... "):
-            rr = requests.post(
-                "http://127.0.0.1:8000/get_stoxx_sheet/", json=data, timeout=1000
-            )
-            if rr.status_code == 200:
-                b64 = base64.b64encode(rr.content).decode()
-                href = f'<a href="data:application/zip;base64,{b64}" download="stoxx_sheets.zip" style = "color: black;">Download Stoxx Sheets</a>'
-                st.markdown(href, unsafe_allow_html=True)
-                status_list_str = rr.headers.get("X-Status-List")
-                status_of_stoxx = json.loads(status_list_str)
-                message = ""
-                for status in status_of_stoxx:
-                    if status["details"] != "Generated successfully":
-                        message += status["details"] + "\n"
-                    else:
-                        message = status["details"] + "\n"
-                if status_of_stoxx[0]["details"] != "Generated successfully":
-                    st.error(message)
-                else:
-                    st.error(message)
-            else:
-                st.error("Failed to generate Stoxx timesheet")
+        rr = requests.post("http://127.0.0.1:8000/stoxx_jobs", json=data, timeout=60)
+        if rr.status_code == 202:
+            st.session_state["stoxx_job_id"] = rr.json()["job_id"]
+            st.session_state.pop("stoxx_result", None)
+        else:
+            st.error("Failed to generate Stoxx timesheet")
+
+    if st.session_state.get("stoxx_job_id"):
+        show_stoxx_job(st.session_state["stoxx_job_id"])
+
+    if st.session_state.get("stoxx_result"):
+        show_stoxx_result(st.session_state["stoxx_result"])
+
+
+def show_stoxx_job(job_id: str):
+    """Shows the progress of the stoxx job and, once it is completed, downloads its zip once into
+    the session along with the employees who have not filled the timesheet, and forgets the job."""
+
+    rr = requests.get(f"http://127.0.0.1:8000/stoxx_jobs/{job_id}", timeout=10)
+    if rr.status_code != 200:
+        del st.session_state["stoxx_job_id"]
+        st.error("Failed to generate Stoxx timesheet")
+        return
+
+    job = rr.json()
+    projects = job["projects"]
+    done = sum(status == "completed" for status in projects.values())
+
+    if job["status"] == "failed":
+        del st.session_state["stoxx_job_id"]
+        st.error(f"Failed to generate Stoxx timesheet: {job['error']}")
+        return
+
+    if job["status"] != "completed":
+        st.progress(done / max(len(projects), 1), text=f"Generated {done} of {len(projects)} project codes")
+        st.button("Refresh status")
+        return
+
+    rr = requests.get(f"http://127.0.0.1:8000/stoxx_jobs/{job_id}/download", timeout=60)
+    del st.session_state["stoxx_job_id"]
+    if rr.status_code != 200:
+        st.error("Failed to download Stoxx timesheet")
+        return
+    st.session_state["stoxx_result"] = {"zip": rr.content, "status_list": job["status_list"]}
+
+
+def show_stoxx_result(result: dict):
+    """Shows the download button of the zip of the last completed stoxx job
+    along with the employees who have not filled the timesheet."""
+
+    st.download_button("Download Stoxx Sheets", data=result["zip"], file_name="stoxx_sheets.zip",
+                       mime="application/zip")
+    message = ""
+    for status in result["status_list"]:
+        if status["details"] != "Generated successfully":
+            message += status["details"] + "\n"
+        else:
+            message = status["details"] + "\n"
+    st.error(message)
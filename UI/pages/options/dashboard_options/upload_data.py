@@ -67,6 +67,9 @@ def upload_data_section():
                 result = upload_file(employee_file, "add_employee_data")
                 if result:
                     st.success(result["message"])
+                    if "inserted" in result:
+                        st.info(f"Added: {result['inserted']}, Updated: {result['updated']}, "
+                                f"Unchanged: {result['unchanged']}")
 
         st.divider()
 
@@ -1,53 +1,50 @@
+import copy
 from typing import List
 import requests
 from datetime import datetime
 
+# url -> (ETag, JSON) of the last response of the cached backend endpoints.
+_responses = {}
+
+
+def get_json(url: str, default):
+    """Returns the JSON at the url, or the default if the request fails.
+    The request carries the ETag of the last response of the url, so the backend answers 304
+    with no body while the data is unchanged and the last JSON is reused."""
+
+    cached = _responses.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = requests.get(url, headers=headers, timeout=10)
+
+    if response.status_code == 304 and cached:
+        return copy.deepcopy(cached[1])
+    if response.status_code == 200:
+        data = response.json()
+        if "ETag" in response.headers:
+            _responses[url] = (response.headers["ETag"], data)
+        return copy.deepcopy(data)
+    return default
+
 
 def employee_data(indxx_id: str):
     """Returns data of an employee from  employee_data table.
     Args: indxx_id (str): The Indxx ID of the employee.
     Return: All the details of the employee in json format."""
     
-    response = requests.get(f"http://127.0.0.1:8000/users/{indxx_id}", timeout=10)
-
-    if response.status_code == 200:
-        profile = response.json()
-        return profile
-    else:
-        return {"indxx_id": "NA"}
+    return get_json(f"http://127.0.0.1:8000/users/{indxx_id}", {"indxx_id": "NA"})
 
 
 def timesheet_condition():
-    response = requests.get(
-        "http://127.0.0.1:8000/get_time_window_status",
-        timeout=10,
-    )
-    if response.status_code == 200:
-        react = response.json()
-        return react
-    else:
-        return {"status": "Freeze"}
+    return get_json("http://127.0.0.1:8000/get_time_window_status", {"status": "Freeze"})
 
 
 def project_code_list() -> List[str]:
     """Returns a list of all the project codes in the database."""
 
-    response = requests.get("http://127.0.0.1:8000/project_codes")
-
-    if response.status_code == 200:
-        options = response.json()
-        return options
-    else:
-        return []
+    return get_json("http://127.0.0.1:8000/project_codes", [])
 
 
 def project_name_list() -> List[str]:
     """Returns a list of all the project codes in the database."""
 
-    response = requests.get("http://127.0.0.1:8000/project_names")
-
-    if response.status_code == 200:
-        options = response.json()
-        return options
-    else:
-        return []
+    return get_json("http://127.0.0.1:8000/project_names", [])